@@ -1,12 +1,12 @@
-from aiogram import Bot, Dispatcher, Router, F
+from aiogram import Dispatcher, Router, F
 from aiogram.filters import CommandStart, CommandObject
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo, PreCheckoutQuery
 
 from core import settings
+# the shared client, still importable from here as it was
+from core import bot as bot
 from db.repository import UsersRepository
 
-bot = Bot(settings.TG_BOT_TOKEN)
-
 dp = Dispatcher()
 router = Router()
 
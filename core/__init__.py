@@ -1,16 +1,54 @@
 from ._settings import settings
-from ._s3 import get_user_profile_photo
-from ._redis import redis, set_user_rating, get_token_price
+from ._telegram import bot, get_telegram_metrics, close_telegram
+from ._images import shutdown_thumbnail_pool
+from ._s3 import get_user_profile_photo, UserAvatar
+from ._redis import redis, ProfileCard, set_profile_cards, set_profile_card_avatar, get_profile_cards, \
+    ReferralSummary, get_referral_summary, set_referral_summary, set_user_rating, set_users_rating, add_users_rating, replace_rating, init_user_rating, incr_users_rating, \
+    get_user_rating_place, get_user_rating_place_and_page, get_rating_page, set_rating_page, \
+    get_token_price, get_game_stats, set_game_stats, incr_game_stats, lock_user_bet_choice, unlock_user_bet_choice, \
+    enqueue_bet, get_pending_bets, set_game_results, get_game_result
 from ._constants import USDT_UZS_PRICE, USDT_RUB_PRICE
 
 __all__ = (
     "settings",
 
+    "bot",
+    "get_telegram_metrics",
+    "close_telegram",
+
+    "shutdown_thumbnail_pool",
+
     "get_user_profile_photo",
+    "UserAvatar",
 
     "redis",
+    "ProfileCard",
+    "set_profile_cards",
+    "set_profile_card_avatar",
+    "get_profile_cards",
+    "ReferralSummary",
+    "get_referral_summary",
+    "set_referral_summary",
     "set_user_rating",
+    "set_users_rating",
+    "add_users_rating",
+    "replace_rating",
+    "init_user_rating",
+    "incr_users_rating",
+    "get_user_rating_place",
+    "get_user_rating_place_and_page",
+    "get_rating_page",
+    "set_rating_page",
     "get_token_price",
+    "get_game_stats",
+    "set_game_stats",
+    "incr_game_stats",
+    "lock_user_bet_choice",
+    "unlock_user_bet_choice",
+    "enqueue_bet",
+    "get_pending_bets",
+    "set_game_results",
+    "get_game_result",
 
     "USDT_RUB_PRICE",
     "USDT_UZS_PRICE",
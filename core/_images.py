@@ -0,0 +1,47 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from core import settings
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def render_thumbnail(data: bytes, size: int, image_format: str, quality: int) -> bytes:
+    """Center crop to a `size` square, runs in the thumbnail pool."""
+    with Image.open(BytesIO(data)) as image:
+        image.draft("RGB", (size, size))
+        thumbnail = ImageOps.fit(ImageOps.exif_transpose(image).convert("RGB"), (size, size), Image.LANCZOS)
+
+    buffer = BytesIO()
+    thumbnail.save(buffer, format=image_format.upper(), quality=quality, method=4 if image_format == "webp" else 0)
+    return buffer.getvalue()
+
+
+def get_thumbnail_pool() -> ProcessPoolExecutor:
+    global _pool
+
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS)
+    return _pool
+
+
+async def make_thumbnail(data: bytes) -> bytes:
+    return await asyncio.get_running_loop().run_in_executor(
+        get_thumbnail_pool(),
+        render_thumbnail,
+        data,
+        settings.THUMBNAIL_SIZE,
+        settings.THUMBNAIL_FORMAT,
+        settings.THUMBNAIL_QUALITY,
+    )
+
+
+def shutdown_thumbnail_pool() -> None:
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
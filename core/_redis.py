@@ -1,14 +1,213 @@
+import json
+from typing import NamedTuple
+
 from redis.asyncio import Redis
 
 from core import settings
+from core._constants import DAY_IN_SECONDS
+
+PROFILE_CARD_TTL = 30 * DAY_IN_SECONDS
 
 redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
 
+# increments the counters only if they were built, a partial hash would hide the real pool
+_incr_game_stats = redis.register_script(
+    """
+    if redis.call("EXISTS", KEYS[1]) == 0 then
+        return 0
+    end
+    redis.call("HINCRBYFLOAT", KEYS[1], ARGV[1] .. ":total_rate", ARGV[2])
+    redis.call("HINCRBY", KEYS[1], ARGV[1] .. ":users", 1)
+    return 1
+    """
+)
+
+
+class ProfileCard(NamedTuple):
+    """What lists of users show about each of them, kept in the `user:{id}:card` hash."""
+    id: int
+    full_name: str
+    avatar: str | None
+
+
+async def set_profile_cards(cards: list[ProfileCard]) -> None:
+    async with redis.pipeline(transaction=False) as pipe:
+        for card in cards:
+            pipe.hset(f"user:{card.id}:card", mapping={"full_name": card.full_name, "avatar": card.avatar or ""})
+            pipe.expire(f"user:{card.id}:card", PROFILE_CARD_TTL)
+        await pipe.execute()
+
+
+async def set_profile_card_avatar(user_id: int, avatar: str) -> None:
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(f"user:{user_id}:card", "avatar", avatar)
+        pipe.expire(f"user:{user_id}:card", PROFILE_CARD_TTL)
+        await pipe.execute()
+
+
+async def get_profile_cards(user_ids: list[int]) -> dict[int, ProfileCard]:
+    """Cards of the users that have one, a card without a name is only a stray avatar update and is skipped."""
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.hmget(f"user:{user_id}:card", "full_name", "avatar")
+        values = await pipe.execute()
+
+    return {
+        user_id: ProfileCard(id=user_id, full_name=full_name, avatar=avatar or None)
+        for user_id, (full_name, avatar) in zip(user_ids, values)
+        if full_name is not None
+    }
+
+
+class ReferralSummary(NamedTuple):
+    total_users: int
+    total_usdt: float
+    total_words: float
+
+
+async def get_referral_summary(ref_id: int) -> ReferralSummary | None:
+    summary = await redis.get(f"user:{ref_id}:referral_summary")
+    return ReferralSummary(*json.loads(summary)) if summary is not None else None
+
+
+async def set_referral_summary(ref_id: int, summary: ReferralSummary, ttl: float) -> None:
+    await redis.set(f"user:{ref_id}:referral_summary", json.dumps(summary), px=int(ttl * 1000))
+
 
 async def set_user_rating(user_id: int, wins: float) -> None:
     await redis.zadd("rating", {user_id: wins})
 
 
+async def set_users_rating(rating: dict[int, float]) -> None:
+    if rating:
+        await redis.zadd("rating", rating)
+
+
+async def add_users_rating(key: str, rating: dict[int, float], ttl: int) -> None:
+    """ZADD into a rating being rebuilt at `key`, the TTL drops it if the rebuild dies halfway."""
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zadd(key, rating)
+        pipe.expire(key, ttl)
+        await pipe.execute()
+
+
+async def replace_rating(key: str) -> None:
+    """Atomically puts the rating rebuilt at `key` in place of `rating`."""
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.rename(key, "rating")
+        pipe.persist("rating")
+        await pipe.execute()
+
+
+async def init_user_rating(user_id: int) -> None:
+    await redis.zadd("rating", {user_id: 0}, nx=True)
+
+
+async def get_user_rating_place(user_id: int) -> tuple[int, int] | None:
+    """1-based place and points of the user, None if the user is not rated yet."""
+    place = await redis.zrevrank("rating", user_id, withscore=True)
+    return (place[0] + 1, int(float(place[1]))) if place is not None else None
+
+
+async def get_user_rating_place_and_page(
+        user_id: int, offset: int, limit: int,
+) -> tuple[tuple[int, int] | None, str | None, list[tuple[int, int]]]:
+    """
+    `get_user_rating_place`, the cached rendered page and `get_rating_page` in one round trip.
+    The page is read even when it is cached, a miss then costs no second round trip.
+    """
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zrevrank("rating", user_id, withscore=True)
+        pipe.get(f"rating:page:{offset}:{limit}")
+        if limit > 0:
+            pipe.zrange("rating", offset, offset + limit - 1, desc=True, withscores=True)
+        place, page, *rows = await pipe.execute()
+
+    return (
+        (place[0] + 1, int(float(place[1]))) if place is not None else None,
+        page,
+        [(int(user_id), int(score)) for user_id, score in rows[0]] if rows else [],
+    )
+
+
+async def get_rating_page(offset: int, limit: int) -> list[tuple[int, int]]:
+    """Users with points from place `offset + 1` on, the place of the i-th one is `offset + i + 1`."""
+    if limit <= 0:
+        return []
+
+    return [
+        (int(user_id), int(score)) for user_id, score in
+        await redis.zrange("rating", offset, offset + limit - 1, desc=True, withscores=True)
+    ]
+
+
+async def set_rating_page(offset: int, limit: int, page: str | bytes, ttl: float) -> None:
+    await redis.set(f"rating:page:{offset}:{limit}", page, px=int(ttl * 1000))
+
+
+async def incr_users_rating(deltas: dict[int, float]) -> None:
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id, delta in deltas.items():
+            if delta:
+                pipe.zincrby("rating", delta, user_id)
+        await pipe.execute()
+
+
 async def get_token_price() -> float | None:
     ret = await redis.get("token_price")
     return float(ret) if ret is not None else None
+
+
+async def get_game_stats(game_id: int) -> dict[str, float] | None:
+    stats = await redis.hgetall(f"game:{game_id}:stats")
+    return {field: float(value) for field, value in stats.items()} if stats else None
+
+
+async def set_game_stats(game_id: int, stats: dict[str, float]) -> None:
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(f"game:{game_id}:stats")
+        pipe.hset(f"game:{game_id}:stats", mapping=stats)
+        pipe.expire(f"game:{game_id}:stats", DAY_IN_SECONDS)
+        await pipe.execute()
+
+
+async def incr_game_stats(game_id: int, currency: str, choice: str, amount: float) -> bool:
+    return bool(await _incr_game_stats(keys=[f"game:{game_id}:stats"], args=[f"{currency}:{choice}", amount]))
+
+
+async def lock_user_bet_choice(game_id: int, user_id: int, currency: str, choice: str) -> str | None:
+    """Remembers the side the user bets on in the game, returns the side remembered earlier if any."""
+    return await redis.set(
+        f"game:{game_id}:user:{user_id}:{currency}:choice", choice, nx=True, get=True, ex=DAY_IN_SECONDS
+    )
+
+
+async def unlock_user_bet_choice(game_id: int, user_id: int, currency: str) -> None:
+    await redis.delete(f"game:{game_id}:user:{user_id}:{currency}:choice")
+
+
+async def enqueue_bet(bet: dict[str, str | int | float]) -> None:
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.xadd("bets:stream", bet)
+        pipe.incr(f"game:{bet['game_id']}:bets_pending")
+        pipe.expire(f"game:{bet['game_id']}:bets_pending", DAY_IN_SECONDS)
+        await pipe.execute()
+
+
+async def get_pending_bets(game_id: int) -> int:
+    return int(await redis.get(f"game:{game_id}:bets_pending") or 0)
+
+
+async def set_game_results(game_id: int, results: dict[int, dict[str, float]], ttl: int, batch_size: int = 5000) -> None:
+    items = [(user_id, json.dumps(result)) for user_id, result in results.items()]
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for i in range(0, len(items), batch_size):
+            pipe.hset(f"game:{game_id}:results", mapping=dict(items[i:i + batch_size]))
+        pipe.expire(f"game:{game_id}:results", ttl)
+        await pipe.execute()
+
+
+async def get_game_result(game_id: int, user_id: int) -> dict[str, float] | None:
+    result = await redis.hget(f"game:{game_id}:results", user_id)
+    return json.loads(result) if result is not None else None
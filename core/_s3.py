@@ -1,13 +1,16 @@
 import asyncio
-import logging
-import random
+import hashlib
+import mimetypes
 from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterable, BinaryIO, NamedTuple
 
-import aiohttp
-from aiogram import Bot
 from miniopy_async import Minio  # type: ignore
+from miniopy_async.error import S3Error  # type: ignore
 
 from core import settings
+from core._images import make_thumbnail
+from core._telegram import bot, telegram_limiter
 
 client = Minio(
     settings.S3_ENDPOINT.replace("https://", "").replace("http://", ""),
@@ -16,48 +19,107 @@ client = Minio(
     secure=not ("localhost" in settings.S3_ENDPOINT or "minio:" in settings.S3_ENDPOINT or False)
 )
 
+PART_SIZE = 5 * 1024 * 1024
+# content addressed objects never change, CDNs and browsers may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
-async def get_user_profile_photo(user_id: int) -> str | None:
-    bot = Bot(settings.TG_BOT_TOKEN)
-    try:
-        user_photos = (await bot.get_user_profile_photos(user_id)).photos
-        file_path = (await bot.get_file(user_photos[0][-1].file_id)).file_path
-    except Exception as e:
-        logging.exception("can't get user photo", exc_info=e)
+# not in the mimetypes table before python 3.13
+mimetypes.add_type("image/webp", ".webp")
+
+
+class UserAvatar(NamedTuple):
+    avatar: str
+    thumbnail: str
+
+
+async def get_user_profile_photo(user_id: int) -> UserAvatar | None:
+    """
+    Copies the user's Telegram avatar and its thumbnail to S3, next to each other under the avatar hash.
+    None if the user has no photo, Telegram errors are raised.
+    """
+    user_photos = (await bot.get_user_profile_photos(user_id, limit=1)).photos
+    if not user_photos:
         return None
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"https://api.telegram.org/file/bot{settings.TG_BOT_TOKEN}/{file_path}") as resp:
-            avatar = await upload_file(
-                data=await resp.read(),
-                extension=file_path.split(".")[-1],
-                user_id=user_id,
-            )
+    file_path = (await bot.get_file(user_photos[0][-1].file_id)).file_path
+    extension = file_path.split(".")[-1]
+
+    with SpooledTemporaryFile(max_size=PART_SIZE) as file:
+        # downloads don't go through the session middlewares, the limiter is taken by hand
+        async with telegram_limiter.slot():
+            chunks = bot.session.stream_content(bot.session.api.file_url(bot.token, file_path))
+            digest = await spool_stream(chunks, file)
+        avatar_key = f"avatars/{digest}.{extension}"
+        await upload_if_missing(avatar_key, file, extension)
+
+        thumbnail_key = f"avatars/{digest}_{settings.THUMBNAIL_SIZE}.{settings.THUMBNAIL_FORMAT}"
+        if not await object_exists(thumbnail_key):
+            file.seek(0)
+            thumbnail = await make_thumbnail(file.read())
+            await put_immutable_object(thumbnail_key, BytesIO(thumbnail), len(thumbnail), settings.THUMBNAIL_FORMAT)
+
+    return UserAvatar(avatar=object_url(avatar_key), thumbnail=object_url(thumbnail_key))
+
 
-    return avatar
+async def spool_stream(chunks: AsyncIterable[bytes], file: BinaryIO) -> str:
+    """Writes the stream to `file` and returns its sha256, the file is left positioned at the end."""
+    digest = hashlib.sha256()
+    async for chunk in chunks:
+        digest.update(chunk)
+        file.write(chunk)
 
+    return digest.hexdigest()
 
-async def upload_file(
-        data: bytes,
-        extension: str,
-        user_id: int,
-) -> str:
-    key = f"avatar_{user_id}_{random.randint(1, 999999)}.{extension}"
 
+async def upload_if_missing(key: str, file: BinaryIO, extension: str) -> None:
+    """Uploads the spooled `file` unless `key` exists, content addressed keys never need an overwrite."""
+    length = file.tell()
+    if not await object_exists(key):
+        file.seek(0)
+        await put_immutable_object(key, file, length, extension)
+
+
+async def upload_file(data: bytes, extension: str, prefix: str) -> str:
+    """
+    Stores `data` under `{prefix}/{sha256}.{extension}`. Avatars are spooled to a temporary file
+    in `get_user_profile_photo` instead, only bodies over PART_SIZE touch the disk there.
+    """
+    key = f"{prefix}/{hashlib.sha256(data).hexdigest()}.{extension}"
+    if not await object_exists(key):
+        await put_immutable_object(key, BytesIO(data), len(data), extension)
+
+    return object_url(key)
+
+
+async def object_exists(key: str) -> bool:
+    try:
+        await client.stat_object(settings.S3_BUCKET, key)
+        return True
+    except S3Error as e:
+        if e.code in {"NoSuchKey", "NoSuchObject", "ResourceNotFound"}:
+            return False
+        raise
+
+
+async def put_immutable_object(key: str, data: BinaryIO, length: int, extension: str) -> None:
     await client.put_object(
         settings.S3_BUCKET,
         key,
-        BytesIO(data),
-        -1,
-        part_size=5 * 1024 * 1024,
+        data,
+        length,
+        content_type=mimetypes.types_map.get(f".{extension}", "application/octet-stream"),
+        part_size=PART_SIZE,
         metadata={
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
             'x-amz-acl': 'public-read',
             'ACL': 'public-read'
         },
     )
 
+
+def object_url(key: str) -> str:
     return f"{settings.HTTP_SCHEMA}{settings.S3_ENDPOINT}/{settings.S3_BUCKET}/{key}"
 
 
 if __name__ == "__main__":
-    asyncio.run(upload_file(b"test", extension="txt", user_id=1))
+    asyncio.run(upload_file(b"test", extension="txt", prefix="test"))
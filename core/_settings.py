@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -7,6 +9,10 @@ class Settings(BaseSettings):
     REDIS_URL: str
 
     TG_BOT_TOKEN: str
+    TG_API_SERVER: str = Field(default="https://api.telegram.org")
+    TG_POOL_SIZE: int = Field(default=100)
+    TG_MAX_CONCURRENCY: int = Field(default=50)
+    TG_RATE_LIMIT: float = Field(default=30)
 
     DEBUG: bool = Field(default=False)
 
@@ -21,6 +27,44 @@ class Settings(BaseSettings):
     DOMAIN: str
 
     RTNET_BASE_URL: str = Field(default="https://rtnet.space")
+    RTNET_POOL_SIZE: int = Field(default=100)
+    RTNET_POOL_SIZE_PER_HOST: int = Field(default=20)
+    RTNET_KEEPALIVE_TIMEOUT: float = Field(default=30)
+    RTNET_TIMEOUT: float = Field(default=30)
+    RTNET_CONNECT_TIMEOUT: float = Field(default=5)
+    RTNET_PUBLIC_KEY: str = Field(
+        default="MIGbMBAGByqGSM49AgEGBSuBBAAjA4GGAAQBU+2j5U/5R1J9IVuEO1x3yPxeEtBXblH9yjepfGWsfPBcQWqjeRPpxGtFcmqMSZKhFGPcWY5uwc3lLIGiRTrKc4oBqK3UXMU+uiJ2LOt4ukmX/uBZmebBWxhO92hNiDxgpmyUmLr6hKKR/Su6pKaWEXzLrRAkkVPxf/PhpGR+havSR1s=",
+    )
+    RTNET_VERIFY_CALLBACKS: bool = Field(default=True)
+    RTNET_CRYPTO_WORKERS: int = Field(default=2)
+
+    SETTLEMENT_MODE: Literal["bulk", "orm"] = Field(default="bulk")
+    SETTLEMENT_BATCH_SIZE: int = Field(default=5000)
+
+    BET_INGESTION_MODE: Literal["direct", "queue"] = Field(default="direct")
+    BET_QUEUE_BATCH_SIZE: int = Field(default=500)
+    BET_QUEUE_FLUSH_INTERVAL: float = Field(default=0.2)
+    BET_QUEUE_DRAIN_TIMEOUT: float = Field(default=60)
+
+    GAME_STATS_RECONCILE_INTERVAL: float = Field(default=5)
+
+    GAMES_CACHE_TTL: float = Field(default=5)
+    RATING_PAGE_CACHE_TTL: float = Field(default=5)
+    REFERRAL_SUMMARY_CACHE_TTL: float = Field(default=60)
+
+    AVATAR_WORKERS: int = Field(default=4)
+    AVATAR_MAX_ATTEMPTS: int = Field(default=5)
+    AVATAR_RETRY_BACKOFF: float = Field(default=2)
+    AVATAR_RECHECK_INTERVAL: int = Field(default=3600)
+
+    THUMBNAIL_SIZE: int = Field(default=128)
+    THUMBNAIL_FORMAT: Literal["webp", "jpeg"] = Field(default="webp")
+    THUMBNAIL_QUALITY: int = Field(default=80)
+    THUMBNAIL_WORKERS: int | None = Field(default=None, description="None for one per core")
+
+    SUBSCRIBE_CACHE_TTL: int = Field(default=600)
+    SUBSCRIBE_NEGATIVE_CACHE_TTL: int = Field(default=10)
+    SUBSCRIBE_CHECK_CONCURRENCY: int = Field(default=10)
 
     RTNET_RUB_PROJECT_ID: str
     RTNET_RUB_API_ID: str
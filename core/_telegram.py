@@ -0,0 +1,96 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from core import settings
+
+
+class TelegramLimiter(BaseRequestMiddleware):
+    """
+    Process wide cap on Bot API calls: at most `max_concurrency` in flight and `rate` started per second.
+    Counts calls for `get_telegram_metrics`.
+    """
+
+    def __init__(self, max_concurrency: int, rate: float):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._interval = 1 / rate
+        self._next_slot = 0.0
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.waiting = 0
+        self.total = 0
+        self.errors = 0
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        async with self.slot():
+            return await make_request(bot, method)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """One call under the limits, also taken around file downloads which bypass the middlewares."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        try:
+            await self._wait_slot()
+            self.in_flight += 1
+            self.total += 1
+            try:
+                yield
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+        finally:
+            self._semaphore.release()
+
+    async def _wait_slot(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+telegram_limiter = TelegramLimiter(
+    max_concurrency=settings.TG_MAX_CONCURRENCY,
+    rate=settings.TG_RATE_LIMIT,
+)
+
+# the one Bot of the process, its aiohttp session and connection pool are reused by every call
+bot = Bot(
+    settings.TG_BOT_TOKEN,
+    session=AiohttpSession(api=TelegramAPIServer.from_base(settings.TG_API_SERVER), limit=settings.TG_POOL_SIZE),
+)
+bot.session.middleware(telegram_limiter)
+
+
+def get_telegram_metrics() -> dict[str, int]:
+    return {
+        "in_flight": telegram_limiter.in_flight,
+        "waiting": telegram_limiter.waiting,
+        "max_concurrency": telegram_limiter.max_concurrency,
+        "total": telegram_limiter.total,
+        "errors": telegram_limiter.errors,
+    }
+
+
+async def close_telegram() -> None:
+    await bot.session.close()
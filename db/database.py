@@ -59,6 +59,26 @@ def transaction():
     return wrapper
 
 
+async def in_new_session(
+        cb: Callable[P, Coroutine[Any, Any, T]], *args: P.args, **kwargs: P.kwargs
+) -> T:
+    """
+    Runs a `transaction()` callback in a session of its own instead of the current one,
+    so that it can be awaited concurrently with other statements (an AsyncSession can't).
+    """
+    with use_context_value(db_session_var, None):
+        return await cb(*args, **kwargs)
+
+
+async def release_connection() -> None:
+    """
+    Commits the current session so that its pooled connection goes back to the pool before fanning out
+    with `in_new_session`. Otherwise every request holds one connection while waiting for more, and a burst
+    the size of the pool deadlocks until the pool timeout. Loaded objects stay usable, commits don't expire them.
+    """
+    await require_session().commit()
+
+
 @contextmanager
 def use_context_value(context: ContextVar[T], value: T):
     reset = context.set(value)
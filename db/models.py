@@ -1,7 +1,8 @@
 import datetime
 import uuid
 
-from sqlalchemy import BigInteger, DateTime, func, String, Boolean, false, null, Float, ForeignKey, UUID, Integer
+from sqlalchemy import BigInteger, DateTime, func, String, Boolean, false, null, Float, ForeignKey, UUID, Integer, Index, \
+    UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -26,9 +27,10 @@ class User(ModelBase):
     nickname: Mapped[str | None] = mapped_column(String, nullable=True)
     full_name: Mapped[str] = mapped_column(String)
     avatar: Mapped[str | None] = mapped_column(String, nullable=True)
+    avatar_thumbnail: Mapped[str | None] = mapped_column(String, nullable=True)
 
     is_admin: Mapped[bool] = mapped_column(Boolean, server_default=false())
-    ref_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    ref_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True, index=True)
 
     balance: Mapped[float] = mapped_column(Float, server_default="0")
     balance_usdt: Mapped[float] = mapped_column(Float, server_default="0")
@@ -48,8 +50,16 @@ class User(ModelBase):
 
 class Game(ModelBase):
     __tablename__ = 'games'
+    __table_args__ = (
+        Index(
+            "ix_games_uncomputed_date_game", "date_game",
+            postgresql_where="is_computed IS false",
+        ),
+    )
 
-    date_game: Mapped[datetime.datetime | None] = mapped_column(DateTime(timezone=True), server_default=null(), nullable=True)
+    date_game: Mapped[datetime.datetime | None] = mapped_column(
+        DateTime(timezone=True), server_default=null(), nullable=True, index=True, unique=True
+    )
     course: Mapped[float | None] = mapped_column(Float, nullable=True, server_default=null())
     course_at_computed: Mapped[float | None] = mapped_column(Float, nullable=True, server_default=null())
     is_computed: Mapped[bool] = mapped_column(Boolean, server_default=false())
@@ -59,6 +69,10 @@ class Game(ModelBase):
 
 class UsersGames(ModelBase):
     __tablename__ = 'users_games_m2m'
+    __table_args__ = (
+        Index("ix_users_games_m2m_game_id_currency_choose", "game_id", "currency", "choose"),
+        Index("ix_users_games_m2m_user_id_game_id", "user_id", "game_id"),
+    )
 
     user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.id', ondelete="CASCADE"))
     game_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('games.id', ondelete="CASCADE"))
@@ -68,6 +82,8 @@ class UsersGames(ModelBase):
     currency: Mapped[str] = mapped_column(String, nullable=False)  # "usdt" and "words"
 
     choose: Mapped[str] = mapped_column(String, nullable=False)  # "yes" and "no"
+    # id of the bets stream entry in queue ingestion mode, a replayed entry is not inserted twice
+    stream_id: Mapped[str | None] = mapped_column(String, nullable=True, unique=True, index=True)
 
     user: Mapped["User"] = relationship(back_populates="users_games")
     game: Mapped["Game"] = relationship(back_populates="users_games")
@@ -76,9 +92,9 @@ class UsersGames(ModelBase):
 class UserReferral(ModelBase):
     __tablename__ = 'users_referrals'
 
-    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.id', ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.id', ondelete="CASCADE"), index=True)
     user_game_id: Mapped[int | None] = mapped_column(BigInteger, ForeignKey('users_games_m2m.id', ondelete="CASCADE"), nullable=True)
-    ref_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.id', ondelete="CASCADE"))
+    ref_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.id', ondelete="CASCADE"), index=True)
 
     amount: Mapped[float] = mapped_column(Float, server_default="0")
     currency: Mapped[str] = mapped_column(String, nullable=False)
@@ -89,6 +105,20 @@ class UserReferral(ModelBase):
     )
 
 
+class ReferralEarning(ModelBase):
+    """Running total of `users_referrals` per (referrer, referral, currency), credited together with them."""
+    __tablename__ = 'referral_earnings'
+    __table_args__ = (
+        UniqueConstraint("ref_id", "user_id", "currency", name="uq_referral_earnings_ref_id_user_id_currency"),
+    )
+
+    ref_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.id', ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.id', ondelete="CASCADE"))
+
+    amount: Mapped[float] = mapped_column(Float, server_default="0")
+    currency: Mapped[str] = mapped_column(String, nullable=False)
+
+
 class FinanceOperation(ModelBase):
     __tablename__ = 'finance_operations'
 
@@ -1,28 +1,46 @@
+import asyncio
 import logging
 import typing
 import uuid
+from collections import defaultdict
 from datetime import UTC
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import AsyncIterator, Dict
 
-from aiogram import Bot
 from aiogram.types import LabeledPrice
 from fastapi import HTTPException
-from sqlalchemy import select, Sequence, func, update
-from sqlalchemy.orm import selectinload
-
-from core import get_user_profile_photo, set_user_rating, redis, settings, get_token_price
+from sqlalchemy import select, Sequence, func, update, insert, case, and_, or_, literal, true, Update, Select, \
+    Row, tuple_, Insert, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+
+from core import init_user_rating, redis, settings, get_token_price, get_game_stats, \
+    set_game_stats, incr_game_stats, enqueue_bet, lock_user_bet_choice, unlock_user_bet_choice, get_game_result, bot, \
+    UserAvatar, ProfileCard, get_profile_cards, set_profile_cards, set_profile_card_avatar, ReferralSummary, \
+    get_referral_summary, set_referral_summary
 from core._constants import STARS_USDT_PRICE
-from db.database import transaction, require_session
-from db.models import User, Game, UsersGames, UserReferral, FinanceOperation, StarsPayment
+from db.database import transaction, require_session, in_new_session
+from db.models import User, Game, UsersGames, UserReferral, FinanceOperation, StarsPayment, ReferralEarning
 from endpoint.models import AdminSetDateGames, GameBet, CurrencyLiteral, Tasks, TypeTasks, ChoiceLiteral, \
     GameStatLiteral, AccountOperationWithdrawRequest, OperationTypeLiteral, AccountOperationDepositRequest
+from utils.avatars import avatar_queue
 from utils.currency import get_usdt_uzs, get_usdt_rub
+from utils.games_cache import games_cache, publish_games_changed
 from utils.get_token_price import get_token_price as gtp
-from utils.tasks import tasks, rewards_for_daily, tasks_json
+from utils.round_down import sql_round_down
+from utils.subscriptions import subscription_cache
+from utils.tasks import rewards_for_daily, get_tasks_catalog
 from utils.time_until_next_day import seconds_until_tomorrow, seconds_until_day_after_tomorrow
 
 
+class UserInitState(typing.NamedTuple):
+    daily_task_day: int
+    can_get_daily_task: bool
+    completed_tasks: set[int]
+    token_price: float | None
+
+
 class UsersRepository:
 
     @staticmethod
@@ -40,18 +58,17 @@ class UsersRepository:
             await UsersRepository.complete_link_task(user_id, task_id)
 
     @staticmethod
-    async def check_subscribe_user(user_id: int, chat_id: int | str, token: str = settings.TG_BOT_TOKEN):
-        bot = Bot(token=token)
-        try:
-            data = await bot.get_chat_member(chat_id, user_id)
-            return data.status not in {"left", "kicked"}
-        except:
-            return True
+    async def check_subscribe_user(user_id: int, chat_id: int | str) -> bool:
+        return await subscription_cache.check(user_id, chat_id)
+
+    @staticmethod
+    async def check_subscribe_users(user_ids: list[int], chat_id: int | str) -> dict[int, bool]:
+        return await subscription_cache.check_many(user_ids, chat_id)
 
     @staticmethod
     @transaction()
     async def get_previous_game_wins(user_id: int) -> Dict[CurrencyLiteral, float] | None:
-        previous_game = await GameRepository.get_previous_game()
+        previous_game = await GameRepository.get_previous_game_cached()
         if not previous_game or not previous_game.is_computed:
             return {}
 
@@ -60,20 +77,13 @@ class UsersRepository:
         if previous_game.date_game is None or current_time > (previous_game.date_game + timedelta(seconds=15)):
             return {}
 
-        user_games = await GameRepository.get_bets_by_user_and_game_id(user_id, previous_game.id)
-        if not user_games:
-            return {}
-
-        game_result = {}
-        for bet in user_games:
-            game_result[bet.currency] = game_result.get(bet.currency, 0) + bet.win_total_rate
-
-        return game_result
+        # written by the settlement, see `GameRepository.get_game_results`
+        return await get_game_result(previous_game.id, user_id) or {}
 
     @staticmethod
     @transaction()
     async def complete_channel_task(user_id: int, task_id: int):
-        if await redis.exists(f"user:{user_id}:task:{task_id}:complete"):
+        if await redis.hexists(f"user:{user_id}:tasks", task_id):
             raise HTTPException(status_code=404, detail="Task already completed")
 
         task = await TaskRepository.get_by_id(task_id)
@@ -84,43 +94,69 @@ class UsersRepository:
             raise HTTPException(status_code=404, detail="Channel is not set")
 
         if await UsersRepository.check_subscribe_user(user_id, task.channel_id):
+            if not await redis.hsetnx(f"user:{user_id}:tasks", task_id, 1):
+                raise HTTPException(status_code=404, detail="Task already completed")
+
             user = await UsersRepository.get_or_raise_by_id(user_id)
             user.balance += task.value
 
-            await redis.set(f"user:{user_id}:task:{task_id}:complete", 1)
-
     @staticmethod
     @transaction()
     async def complete_link_task(user_id: int, task_id: int):
-        if await redis.exists(f"user:{user_id}:task:{task_id}:complete"):
+        if await redis.hexists(f"user:{user_id}:tasks", task_id):
             raise HTTPException(status_code=404, detail="Task already completed")
 
         task = await TaskRepository.get_by_id(task_id)
         if task is None:
             raise HTTPException(status_code=404, detail="Task not found")
 
+        if not await redis.hsetnx(f"user:{user_id}:tasks", task_id, 1):
+            raise HTTPException(status_code=404, detail="Task already completed")
+
         user = await UsersRepository.get_or_raise_by_id(user_id)
         user.balance += task.value
 
-        await redis.set(f"user:{user_id}:task:{task_id}:complete", 1)
-
     @staticmethod
-    @transaction()
-    async def get_updates_task_status(user_id: int) -> dict[TypeTasks, list[Tasks]]:
-        tasks_json_copy = tasks_json.copy()
-        daily_task = tasks_json_copy["Daily reward"][0]
-
-        daily_task["status"] = "waiting" if await UsersRepository.can_get_daily_task(user_id) else "done"
-        daily_task["value"] = await UsersRepository.next_daily_bonus(user_id)
+    async def get_init_state(user_id: int) -> UserInitState:
+        """Reads every Redis value the init screen needs in one pipeline."""
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.get(f"user:{user_id}:daily_task_day")
+            pipe.exists(f"user:{user_id}:daily_task_day_status")
+            pipe.get("token_price")
+            pipe.hkeys(f"user:{user_id}:tasks")
+
+            daily_task_day, daily_task_day_status, token_price, completed = await pipe.execute()
+
+        return UserInitState(
+            daily_task_day=int(daily_task_day) if isinstance(daily_task_day, str) else 1,
+            can_get_daily_task=not daily_task_day_status,
+            completed_tasks={int(task_id) for task_id in completed},
+            token_price=float(token_price) if token_price is not None else None,
+        )
 
-        tasks_json_copy["Daily reward"] = [daily_task]
-        other_tasks = tasks_json_copy["Tasks list"]
+    @staticmethod
+    async def get_updates_task_status(
+            user_id: int, state: UserInitState | None = None
+    ) -> dict[TypeTasks, list[Tasks]]:
+        if state is None:
+            state = await UsersRepository.get_init_state(user_id)
+
+        return {
+            tasks_type: [
+                task.model_copy(update=UsersRepository.get_task_overlay(task, state))
+                for task in tasks_list
+            ] for tasks_type, tasks_list in get_tasks_catalog().groups.items()
+        }
 
-        for other_task in other_tasks:
-            if other_task["type"] in {"channel", "link"}:
-                other_task["status"] = "done" if await redis.exists(f"user:{user_id}:task:{other_task["id"]}:complete") else "waiting"
+    @staticmethod
+    def get_task_overlay(task: Tasks, state: UserInitState) -> dict[str, typing.Any]:
+        if task.type == "daily":
+            return {
+                "status": "waiting" if state.can_get_daily_task else "done",
+                "value": rewards_for_daily[state.daily_task_day],
+            }
 
-        return tasks_json_copy
+        return {"status": "done" if task.id in state.completed_tasks else "waiting"}
 
     @staticmethod
     async def next_daily_bonus(user_id: int) -> int:
@@ -168,11 +204,62 @@ class UsersRepository:
         )
 
         db.add(referral_record)
+        await db.execute(
+            UsersRepository.upsert_referral_earnings()
+            .values(ref_id=ref_id, user_id=user_id, currency=currency, amount=amount)
+        )
         await db.commit()
         await db.refresh(referral_record)
 
         return referral_record
 
+    @staticmethod
+    def upsert_referral_earnings() -> Insert:
+        """Adds to the `referral_earnings` totals, a (ref_id, user_id, currency) may appear once per statement."""
+        query = pg_insert(ReferralEarning)
+        return query.on_conflict_do_update(
+            constraint="uq_referral_earnings_ref_id_user_id_currency",
+            set_={"amount": ReferralEarning.amount + query.excluded.amount, "time_updated": func.now()},
+        )
+
+    @staticmethod
+    @transaction()
+    async def credit_referrals(credits: list[dict]) -> None:
+        """
+        Records the referral rewards of a settled round and credits the referrers in three statements,
+        `credits` are the `users_referrals` rows. Not committed, they belong to the settlement transaction.
+        """
+        if not credits:
+            return
+
+        db = require_session()
+        # pending ORM changes of the same users must be written before the relative updates below
+        await db.flush()
+
+        await db.execute(insert(UserReferral), credits)
+
+        earnings: dict[tuple[int, int, str], float] = defaultdict(float)
+        referrers: dict[int, float] = defaultdict(float)
+        for credit in credits:
+            earnings[(credit["ref_id"], credit["user_id"], credit["currency"])] += credit["amount"]
+            referrers[credit["ref_id"]] += credit["amount"]
+
+        await db.execute(
+            UsersRepository.upsert_referral_earnings()
+            .values([
+                {"ref_id": ref_id, "user_id": user_id, "currency": currency, "amount": amount}
+                for (ref_id, user_id, currency), amount in earnings.items()
+            ])
+        )
+
+        users = User.__table__
+        await db.execute(
+            update(users)
+            .where(users.c.id == bindparam("referrer_id"))
+            .values(balance=users.c.balance + bindparam("credit")),
+            [{"referrer_id": ref_id, "credit": amount} for ref_id, amount in referrers.items()],
+        )
+
     @staticmethod
     @transaction()
     async def reward_for_referral_and_user(user_id: int, ref_id: int) -> None:
@@ -192,8 +279,7 @@ class UsersRepository:
 
     @staticmethod
     @transaction()
-    async def create_stars_payment(amount_stars: int, token: str = settings.TG_BOT_TOKEN) -> str | None:
-        bot = Bot(token=token)
+    async def create_stars_payment(amount_stars: int) -> str | None:
         amount_usdt = amount_stars * STARS_USDT_PRICE
 
         try:
@@ -229,18 +315,58 @@ class UsersRepository:
         db.add(stars_payment)
         await db.commit()
 
+    @staticmethod
+    def referral_amount(currency: CurrencyLiteral):
+        return func.coalesce(func.sum(ReferralEarning.amount).filter(ReferralEarning.currency == currency), 0)
+
     @staticmethod
     @transaction()
-    async def get_referral_rewards(users: list[User]) -> Sequence[UserReferral]:
+    async def get_referral_rewards(ref_id: int, limit: int, offset: int = 0) -> Sequence[Row]:
+        """
+        `(user_id, usdt, words)` rewards paid to `ref_id` per referral, in the order the referrals first paid.
+        Read from the `referral_earnings` totals, not the individual rewards.
+        """
         db = require_session()
 
         return (
             await db.execute(
-                select(UserReferral)
-                .where(UserReferral.user_id.in_([user.id for user in users]))
-                .options(selectinload(UserReferral.user))
+                select(
+                    ReferralEarning.user_id,
+                    UsersRepository.referral_amount("USDT"),
+                    UsersRepository.referral_amount("WORDS"),
+                )
+                .where(ReferralEarning.ref_id == ref_id)
+                .group_by(ReferralEarning.user_id)
+                .order_by(func.min(ReferralEarning.id))
+                .limit(limit)
+                .offset(offset)
             )
-        ).scalars().all()
+        ).all()
+
+    @staticmethod
+    @transaction()
+    async def get_referral_summary(ref_id: int) -> ReferralSummary:
+        """Headline numbers of `/profiles/referral`, cached for REFERRAL_SUMMARY_CACHE_TTL seconds."""
+        summary = await get_referral_summary(ref_id)
+        if summary is not None:
+            return summary
+
+        db = require_session()
+
+        total_users, total_usdt, total_words = (
+            await db.execute(
+                select(
+                    func.count(ReferralEarning.user_id.distinct()),
+                    UsersRepository.referral_amount("USDT"),
+                    UsersRepository.referral_amount("WORDS"),
+                )
+                .where(ReferralEarning.ref_id == ref_id)
+            )
+        ).one()
+
+        summary = ReferralSummary(total_users=total_users, total_usdt=total_usdt, total_words=total_words)
+        await set_referral_summary(ref_id, summary, settings.REFERRAL_SUMMARY_CACHE_TTL)
+        return summary
 
     @staticmethod
     @transaction()
@@ -278,27 +404,59 @@ class UsersRepository:
 
         user = await UsersRepository.get_by_id(user_id)
         if user is not None:
+            if user.avatar is None:
+                await avatar_queue.enqueue_missing(user_id)
             return user
 
-        avatar = await get_user_profile_photo(user_id)
         new_user = User(
             id=user_id,
             full_name=full_name,
             nickname=username,
-            avatar=avatar,
             ref_id=ref_id,
             balance=20000,
         )
 
         db.add(new_user)
         await db.commit()
+        await set_profile_cards([UsersRepository.to_profile_card(new_user)])
+
+        # the avatar is copied from Telegram in the background and set by `set_avatar`
+        avatar_queue.enqueue(user_id)
 
         if ref_id is not None:
             await UsersRepository.reward_for_referral_and_user(user_id, ref_id)
 
-        await set_user_rating(user_id, await GameRepository.get_user_rating(user_id))
+        await init_user_rating(user_id)
         return new_user
 
+    @staticmethod
+    def debit_balance_query(user_id: int, currency: CurrencyLiteral, amount: float) -> Update:
+        """`UPDATE users ... RETURNING` that debits the balance of the currency only if it covers the amount."""
+        balance_column = User.balance_usdt if currency == "USDT" else User.balance
+
+        return (
+            update(User)
+            .where(
+                User.id == user_id,
+                balance_column >= amount,
+            )
+            .values({balance_column: balance_column - amount})
+            .returning(User.id, User.balance, User.balance_usdt)
+        )
+
+    @staticmethod
+    @transaction()
+    async def set_avatar(user_id: int, avatar: UserAvatar) -> None:
+        db = require_session()
+
+        await db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(avatar=avatar.avatar, avatar_thumbnail=avatar.thumbnail)
+        )
+        await db.commit()
+        await set_profile_card_avatar(user_id, avatar.thumbnail)
+
     @staticmethod
     @transaction()
     async def get_or_raise_by_id(user_id: int) -> User:
@@ -321,6 +479,24 @@ class UsersRepository:
             )
         ).scalars().all()
 
+    @staticmethod
+    def to_profile_card(user: User) -> ProfileCard:
+        return ProfileCard(id=user.id, full_name=user.full_name, avatar=user.avatar_thumbnail or user.avatar)
+
+    @staticmethod
+    @transaction()
+    async def get_profile_cards(user_ids: list[int]) -> dict[int, ProfileCard]:
+        """Cards from Redis, the few missing ones are read from the database and cached. Unknown users are left out."""
+        cards = await get_profile_cards(user_ids)
+
+        missing = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in cards]
+        if missing:
+            loaded = [UsersRepository.to_profile_card(user) for user in await UsersRepository.get_by_ids(missing)]
+            await set_profile_cards(loaded)
+            cards.update({card.id: card for card in loaded})
+
+        return cards
+
 
 class GameRepository:
     @staticmethod
@@ -387,6 +563,61 @@ class GameRepository:
             )
         ).scalars().all()
 
+    @staticmethod
+    @transaction()
+    async def get_bet_history(
+            user_id: int,
+            limit: int | None = None,
+            before: tuple[datetime, int] | None = None,
+            since: tuple[datetime, int] | None = None,
+    ) -> Sequence[Row]:
+        """
+        Bet history rows newest first, keyset paginated on `(date_game, id)`: `before` pages to older bets,
+        `since` returns only the bets newer than the position, the oldest of them first taken under `limit`.
+        """
+        db = require_session()
+
+        position = tuple_(Game.date_game, UsersGames.id)
+        query = (
+            select(
+                UsersGames.id,
+                UsersGames.total_rate,
+                UsersGames.currency,
+                UsersGames.choose,
+                UsersGames.win_total_rate,
+                UsersGames.time_created,
+                Game.id.label("game_id"),
+                Game.date_game,
+                Game.course,
+                Game.course_at_computed,
+            )
+            .join(Game, Game.id == UsersGames.game_id)
+            .where(
+                UsersGames.user_id == user_id,
+                Game.course.isnot(None),
+            )
+            .limit(limit)
+        )
+
+        if since is not None:
+            rows = (
+                await db.execute(
+                    query
+                    .where(position > tuple_(*since))
+                    .order_by(Game.date_game.asc(), UsersGames.id.asc())
+                )
+            ).all()
+            return rows[::-1]
+
+        if before is not None:
+            query = query.where(position < tuple_(*before))
+
+        return (
+            await db.execute(
+                query.order_by(Game.date_game.desc(), UsersGames.id.desc())
+            )
+        ).all()
+
     @staticmethod
     @transaction()
     async def get_bets_by_user_and_game_id(user_id: int, game_id: int) -> Sequence[UsersGames]:
@@ -460,9 +691,259 @@ class GameRepository:
 
         return rating
 
+    @staticmethod
+    def users_rating_query() -> Select:
+        """`get_user_rating` rules as one GROUP BY: the sum of won YES/NO bets, USDT counted ×1000."""
+        is_win = or_(
+            and_(Game.course_at_computed > Game.course, UsersGames.choose == "YES"),
+            and_(Game.course_at_computed < Game.course, UsersGames.choose == "NO"),
+        )
+        points = case(
+            (UsersGames.currency == "WORDS", UsersGames.win_total_rate),
+            (UsersGames.currency == "USDT", UsersGames.win_total_rate * 1000),
+            else_=0,
+        )
+
+        return (
+            select(UsersGames.user_id, func.sum(points).label("points"))
+            .select_from(UsersGames)
+            .join(Game, Game.id == UsersGames.game_id)
+            .where(
+                Game.course_at_computed.isnot(None),
+                UsersGames.win_total_rate.isnot(None),
+                is_win,
+            )
+            .group_by(UsersGames.user_id)
+        )
+
+    @staticmethod
+    @transaction()
+    async def get_users_rating(user_ids: list[int]) -> dict[int, float]:
+        """Set-based variant of `get_user_rating` for many users in a single GROUP BY."""
+        db = require_session()
+
+        rows = (
+            await db.execute(
+                GameRepository.users_rating_query()
+                .where(UsersGames.user_id.in_(user_ids))
+            )
+        ).all()
+
+        rating = {user_id: 0.0 for user_id in user_ids}
+        rating.update({user_id: points_sum or 0.0 for user_id, points_sum in rows})
+        return rating
+
+    @staticmethod
+    async def stream_all_users_rating(batch_size: int) -> AsyncIterator[dict[int, float]]:
+        """Rating of every user, those without wins included, streamed from the server in batches."""
+        db = require_session()
+
+        wins = GameRepository.users_rating_query().subquery()
+        result = await db.stream(
+            select(User.id, func.coalesce(wins.c.points, 0))
+            .outerjoin(wins, wins.c.user_id == User.id)
+            .execution_options(yield_per=batch_size)
+        )
+
+        async for rows in result.partitions():
+            yield {user_id: points for user_id, points in rows}
+
+    @staticmethod
+    @transaction()
+    async def get_game_results(game_id: int) -> dict[int, dict[CurrencyLiteral, float]]:
+        """Net result of every bettor of a settled game by currency."""
+        db = require_session()
+
+        rows = (
+            await db.execute(
+                select(UsersGames.user_id, UsersGames.currency, func.sum(UsersGames.win_total_rate))
+                .where(
+                    UsersGames.game_id == game_id,
+                    UsersGames.win_total_rate.isnot(None),
+                )
+                .group_by(UsersGames.user_id, UsersGames.currency)
+            )
+        ).all()
+
+        results: dict[int, dict[CurrencyLiteral, float]] = {}
+        for user_id, currency, win_total_rate in rows:
+            results.setdefault(user_id, {})[currency] = win_total_rate
+
+        return results
+
+    @staticmethod
+    @transaction()
+    async def get_unsettled_bet_ids(game_id: int) -> Sequence[int]:
+        db = require_session()
+
+        return (
+            await db.execute(
+                select(UsersGames.id)
+                .where(
+                    UsersGames.game_id == game_id,
+                    UsersGames.win_total_rate.is_(None),
+                )
+                .order_by(UsersGames.id)
+            )
+        ).scalars().all()
+
+    @staticmethod
+    @transaction()
+    async def get_rating_deltas(game_id: int) -> dict[int, float]:
+        """
+        Rating points each winner of a settled game adds. Uses `users_rating_query` as is,
+        so the incremental leaderboard can't drift from `get_user_rating` or a rebuild on ties and rounding.
+        """
+        db = require_session()
+
+        rows = (
+            await db.execute(
+                GameRepository.users_rating_query()
+                .where(UsersGames.game_id == game_id)
+            )
+        ).all()
+
+        return {user_id: points_sum for user_id, points_sum in rows if points_sum}
+
+    @staticmethod
+    @transaction()
+    async def settle_bets_bulk(
+            game_id: int,
+            choice: ChoiceLiteral,
+            ratios: dict[CurrencyLiteral, float],
+            first_bet_id: int,
+            last_bet_id: int,
+    ) -> None:
+        """
+        Settles the unsettled bets of the game with ids in [first_bet_id, last_bet_id]
+        with a few set-based statements and commits them as one unit.
+
+        Mirrors the per-bet loop of `process_game_bet_orm`: winners get `total_rate * ratio`
+        credited, `wins` incremented and WORDS winners pay 5% to their referrer.
+        Already settled bets (`win_total_rate` is set) are skipped, so a batch can be re-run.
+        """
+        db = require_session()
+
+        batch = and_(
+            UsersGames.game_id == game_id,
+            UsersGames.id.between(first_bet_id, last_bet_id),
+            UsersGames.win_total_rate.is_(None),
+        )
+        is_win = UsersGames.choose == choice
+        payout = UsersGames.total_rate * case(
+            (UsersGames.currency == "USDT", ratios["USDT"]),
+            else_=ratios["WORDS"],
+        )
+
+        credits = (
+            select(
+                UsersGames.user_id.label("user_id"),
+                func.sum(case((UsersGames.currency == "USDT", payout), else_=0)).label("usdt"),
+                func.sum(case((UsersGames.currency == "USDT", 0), else_=payout)).label("words"),
+                func.count(UsersGames.id).label("wins"),
+            )
+            .where(batch, is_win)
+            .group_by(UsersGames.user_id)
+            .subquery()
+        )
+        await db.execute(
+            update(User)
+            .where(User.id == credits.c.user_id)
+            .values(
+                balance=User.balance + credits.c.words,
+                balance_usdt=User.balance_usdt + credits.c.usdt,
+                wins=User.wins + credits.c.wins,
+            )
+        )
+
+        referrer = aliased(User)
+        referral_amount = sql_round_down(UsersGames.total_rate * 0.05)
+        referral_bets = (
+            select(UsersGames)
+            .join(User, User.id == UsersGames.user_id)
+            .join(referrer, referrer.id == User.ref_id)
+            .where(batch, is_win, UsersGames.currency == "WORDS")
+        )
+        await db.execute(
+            insert(UserReferral)
+            .from_select(
+                ["user_id", "ref_id", "user_game_id", "amount", "currency"],
+                referral_bets.with_only_columns(
+                    UsersGames.user_id, User.ref_id, UsersGames.id, referral_amount, UsersGames.currency,
+                )
+            )
+        )
+
+        await db.execute(
+            UsersRepository.upsert_referral_earnings()
+            .from_select(
+                ["ref_id", "user_id", "currency", "amount"],
+                referral_bets.with_only_columns(
+                    User.ref_id, UsersGames.user_id, UsersGames.currency, func.sum(referral_amount),
+                ).group_by(User.ref_id, UsersGames.user_id, UsersGames.currency)
+            )
+        )
+
+        referral_credits = (
+            referral_bets.with_only_columns(
+                User.ref_id.label("ref_id"),
+                func.sum(referral_amount).label("amount"),
+            )
+            .group_by(User.ref_id)
+            .subquery()
+        )
+        await db.execute(
+            update(User)
+            .where(User.id == referral_credits.c.ref_id)
+            .values(balance=User.balance + referral_credits.c.amount)
+        )
+
+        await db.execute(
+            update(UsersGames)
+            .where(batch)
+            .values(
+                win_total_rate=case(
+                    (is_win, sql_round_down(payout)),
+                    else_=-sql_round_down(payout),
+                )
+            )
+        )
+        await db.commit()
+
     @staticmethod
     @transaction()
     async def get_stats_of_game(game_id: int) -> dict[CurrencyLiteral, dict[ChoiceLiteral, dict[GameStatLiteral, float]]]:
+        counters = await get_game_stats(game_id)
+        if counters is None:
+            return await GameRepository.reconcile_stats_of_game(game_id)
+
+        return {
+            currency_: {
+                choice_: {
+                    stat_: counters.get(f"{currency_}:{choice_}:{stat_}", 0)
+                    for stat_ in typing.get_args(GameStatLiteral)
+                } for choice_ in typing.get_args(ChoiceLiteral)
+            } for currency_ in typing.get_args(CurrencyLiteral)
+        }
+
+    @staticmethod
+    @transaction()
+    async def reconcile_stats_of_game(game_id: int) -> dict[CurrencyLiteral, dict[ChoiceLiteral, dict[GameStatLiteral, float]]]:
+        """Rebuilds the live Redis pool counters of the game from SQL and returns the SQL stats."""
+        stats = await GameRepository.compute_stats_of_game(game_id)
+
+        await set_game_stats(game_id, {
+            f"{currency_}:{choice_}:{stat_}": value
+            for currency_, choices in stats.items()
+            for choice_, choice_stats in choices.items()
+            for stat_, value in choice_stats.items()
+        })
+
+        return stats
+
+    @staticmethod
+    @transaction()
+    async def compute_stats_of_game(game_id: int) -> dict[CurrencyLiteral, dict[ChoiceLiteral, dict[GameStatLiteral, float]]]:
         db = require_session()
         ret_stat: dict[GameStatLiteral, float] = {
             stat_: 0 for stat_ in list(typing.get_args(GameStatLiteral))
@@ -532,6 +1013,7 @@ class GameRepository:
             .values(course_at_computed=await get_token_price())
         )
         await db.commit()
+        await publish_games_changed()
 
     @staticmethod
     @transaction()
@@ -582,18 +1064,37 @@ class GameRepository:
             )
         ).scalar_one_or_none()
 
+    @staticmethod
+    async def get_games_snapshot() -> tuple[Game | None, Game | None]:
+        """Next and previous game from the per-worker cache, see `utils.games_cache`."""
+        async def load() -> tuple[tuple[Game | None, Game | None], float | None]:
+            next_game, previous_game = await asyncio.gather(
+                in_new_session(GameRepository.get_next_game),
+                in_new_session(GameRepository.get_previous_game),
+            )
+            # the next game turns into the previous one at its date without any event
+            return (next_game, previous_game), next_game.date_game.timestamp() if next_game else None
+
+        return await games_cache.get_or_load(load)
+
+    @staticmethod
+    async def get_next_game_cached() -> Game | None:
+        return (await GameRepository.get_games_snapshot())[0]
+
+    @staticmethod
+    async def get_previous_game_cached() -> Game | None:
+        return (await GameRepository.get_games_snapshot())[1]
+
     @staticmethod
     @transaction()
-    async def get_or_raise_by_id(game_id: int) -> Game:
+    async def get_or_raise_by_id(game_id: int, with_bets: bool = True) -> Game:
         db = require_session()
-        game = (
-            await db.execute(
-                select(Game)
-                .where(Game.id == game_id)
-                .options(selectinload(Game.users_games))
 
-            )
-        ).scalar_one_or_none()
+        query = select(Game).where(Game.id == game_id)
+        if with_bets:
+            query = query.options(selectinload(Game.users_games))
+
+        game = (await db.execute(query)).scalar_one_or_none()
 
         if game is None:
             raise HTTPException(status_code=404, detail="Game not found")
@@ -662,6 +1163,7 @@ class GameRepository:
 
         db.add_all(games)
         await db.commit()
+        await publish_games_changed()
 
         return dates
 
@@ -686,59 +1188,168 @@ class GameRepository:
 
     @staticmethod
     @transaction()
-    async def bet(user_id: int, game_id: int, bet_model: GameBet) -> UsersGames:
-        db = require_session()
+    async def bet(user_id: int, game_id: int, bet_model: GameBet) -> tuple[UsersGames, float, float]:
+        """Places the bet and returns it with the user's balance and balance_usdt after the debit."""
+        # only the game row, the settlement is the one that needs the bets of the round
+        game = await GameRepository.get_or_raise_by_id(game_id, with_bets=False)
 
-        user = await UsersRepository.get_or_raise_by_id(user_id)
-        game = await GameRepository.get_or_raise_by_id(game_id)
+        if bet_model.currency == "WORDS":
+            bet_model.amount = int(bet_model.amount)
+
+        if bet_model.amount <= 0:
+            raise HTTPException(status_code=400, detail="Amount must be greater than zero")
+
+        if settings.BET_INGESTION_MODE == "queue":
+            bet_game, balance, balance_usdt = await GameRepository.reserve_bet(user_id, game, bet_model)
+        else:
+            bet_game, balance, balance_usdt = await GameRepository.insert_bet(user_id, game, bet_model)
+
+        try:
+            if not await incr_game_stats(game_id, bet_model.currency, bet_model.choice, bet_model.amount):
+                await GameRepository.reconcile_stats_of_game(game_id)
+        except Exception as e:
+            logging.exception("can't update game stats counters", exc_info=e)
+
+        return bet_game, balance, balance_usdt
+
+    @staticmethod
+    @transaction()
+    async def insert_bet(user_id: int, game: Game, bet_model: GameBet) -> tuple[UsersGames, float, float]:
+        """
+        The balance check, the debit and the bet insert are one conditional statement,
+        so concurrent bets of the same user can't overdraw or lose an update.
+        """
+        db = require_session()
 
         user_bet_choice = await GameRepository.get_user_bet_choice(
-            user_id, game_id, bet_model.currency
+            user_id, game.id, bet_model.currency
         )
 
         if user_bet_choice is not None and user_bet_choice != bet_model.choice:
             raise HTTPException(status_code=400, detail=f"You can bet only {user_bet_choice}")
 
-        if bet_model.currency == "WORDS":
-            bet_model.amount = int(bet_model.amount)
+        debit = UsersRepository.debit_balance_query(user_id, bet_model.currency, bet_model.amount).cte("debit")
+        bet_insert = (
+            insert(UsersGames)
+            .from_select(
+                ["user_id", "game_id", "total_rate", "currency", "choose"],
+                select(
+                    debit.c.id,
+                    literal(game.id),
+                    literal(bet_model.amount),
+                    literal(bet_model.currency),
+                    literal(bet_model.choice),
+                )
+            )
+            .returning(UsersGames.id, UsersGames.time_created)
+            .cte("bet_insert")
+        )
 
-        if bet_model.amount <= 0:
-            raise HTTPException(status_code=400, detail="Amount must be greater than zero")
+        placed = (
+            await db.execute(
+                select(bet_insert.c.id, bet_insert.c.time_created, debit.c.balance, debit.c.balance_usdt)
+                .select_from(bet_insert)
+                .join(debit, true())
+            )
+        ).one_or_none()
+        await db.commit()
 
-        if bet_model.currency == "USDT":
-            if user.balance_usdt < bet_model.amount:
-                raise HTTPException(status_code=400, detail="Not enough money")
+        if placed is None:
+            await UsersRepository.get_or_raise_by_id(user_id)
+            raise HTTPException(status_code=400, detail="Not enough money")
 
-            user.balance_usdt -= bet_model.amount
+        bet_game = UsersGames(
+            id=placed.id,
+            time_created=placed.time_created,
+            user_id=user_id,
+            game_id=game.id,
+            total_rate=bet_model.amount,
+            currency=bet_model.currency,
+            choose=bet_model.choice,
+        )
+        set_committed_value(bet_game, "game", game)
 
-        else:
-            if user.balance < bet_model.amount:
-                raise HTTPException(status_code=400, detail="Not enough money")
+        return bet_game, placed.balance, placed.balance_usdt
+
+    @staticmethod
+    @transaction()
+    async def reserve_bet(user_id: int, game: Game, bet_model: GameBet) -> tuple[UsersGames, float, float]:
+        """
+        Queue ingestion mode: debits the balance and appends the bet to the Redis bets stream,
+        `utils.bet_queue` writes it to `users_games_m2m` later with multi-row inserts.
+        """
+        db = require_session()
+
+        # the lock is seeded from SQL, bets placed in direct mode or before the key expired have no lock
+        sql_bet_choice = await GameRepository.get_user_bet_choice(user_id, game.id, bet_model.currency)
+        user_bet_choice = await lock_user_bet_choice(
+            game.id, user_id, bet_model.currency, sql_bet_choice or bet_model.choice
+        ) or sql_bet_choice
+        if user_bet_choice is not None and user_bet_choice != bet_model.choice:
+            raise HTTPException(status_code=400, detail=f"You can bet only {user_bet_choice}")
+
+        balances = (
+            await db.execute(UsersRepository.debit_balance_query(user_id, bet_model.currency, bet_model.amount))
+        ).one_or_none()
+        await db.commit()
 
-            user.balance -= bet_model.amount
+        if balances is None:
+            if user_bet_choice is None:
+                await unlock_user_bet_choice(game.id, user_id, bet_model.currency)
+            await UsersRepository.get_or_raise_by_id(user_id)
+            raise HTTPException(status_code=400, detail="Not enough money")
 
         bet_game = UsersGames(
-            game=game,
-            user=user,
+            user_id=user_id,
+            game_id=game.id,
             total_rate=bet_model.amount,
             currency=bet_model.currency,
             choose=bet_model.choice,
+            time_created=datetime.now(UTC),
         )
+        set_committed_value(bet_game, "game", game)
 
-        db.add(bet_game)
-        await db.commit()
+        try:
+            await enqueue_bet({
+                "user_id": user_id,
+                "game_id": game.id,
+                "total_rate": bet_model.amount,
+                "currency": bet_model.currency,
+                "choose": bet_model.choice,
+                "time_created": bet_game.time_created.isoformat(),
+            })
+        except Exception as e:
+            logging.exception("can't enqueue bet, refunding", exc_info=e)
 
-        return bet_game
+            balance_column = User.balance_usdt if bet_model.currency == "USDT" else User.balance
+            await db.execute(
+                update(User)
+                .where(User.id == user_id)
+                .values({balance_column: balance_column + bet_model.amount})
+            )
+            await db.commit()
+            raise HTTPException(status_code=503, detail="Bet is not accepted, try again")
+
+        return bet_game, balances.balance, balances.balance_usdt
+
+    @staticmethod
+    @transaction()
+    async def insert_bets(bets: list[dict[str, typing.Any]]) -> None:
+        """Bets already written under the same `stream_id` are skipped, the queue delivers at least once."""
+        db = require_session()
+
+        await db.execute(
+            pg_insert(UsersGames)
+            .values(bets)
+            .on_conflict_do_nothing(index_elements=[UsersGames.stream_id])
+        )
+        await db.commit()
 
 
 class TaskRepository:
     @staticmethod
     async def get_by_id(task_id: int) -> Tasks | None:
-        for task in tasks:
-            if task.id == task_id:
-                return task
-
-        return None
+        return get_tasks_catalog().by_id.get(task_id)
 
 
 class FinanceOperationRepository:
@@ -1,25 +1,32 @@
+import asyncio
 import json
 import typing
 from datetime import datetime, UTC
 
 from aiogram.utils.web_app import WebAppInitData
-from fastapi import APIRouter, Depends, HTTPException, Body, Header
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Request, Response
+from pydantic import TypeAdapter
 
-from core import redis, set_user_rating, settings
+from core import redis, init_user_rating, settings, get_user_rating_place, get_user_rating_place_and_page, \
+    set_rating_page
 from core._constants import USDT_RUB_PRICE, USDT_UZS_PRICE
-from db.database import transaction
+from db.database import transaction, in_new_session, release_connection
 from db.repository import UsersRepository, GameRepository, FinanceOperationRepository
 from endpoint.depends import get_web_app_info
-from endpoint.models import Init, Rating, AdminSetDateGames, GameBet, GameBetResponse, ReferralResponse, \
+from endpoint.models import Init, Rating, RatingUser, AdminSetDateGames, GameBet, GameBetResponse, ReferralResponse, \
     CompleteTaskInput, InitGameResponse, AccountOperationWithdrawRequest, AccountOperationWithdrawResponse, ProfileBetHistory, \
-    AccountOperationDepositRequest, CreatedInvoiceDto, InvoiceModel, LogoGameStartResponse, LogoGameEndResponse, StarsPaymentRequest, StarsPaymentResponse
+    ProfileBetHistoryPage, AccountOperationDepositRequest, CreatedInvoiceDto, InvoiceModel, LogoGameStartResponse, LogoGameEndResponse, StarsPaymentRequest, StarsPaymentResponse
 from endpoint.to_model import user_to_model_init, user_to_model_rating_user, bet_game_to_model_game_bet, \
-    referrals_to_model_referral, game_to_model_init_game
+    referrals_to_model_referral, game_to_model_init_game, bet_history_adapter, bet_history_to_model, \
+    bet_history_to_model_page
+from utils.cursor import decode_cursor
 from utils.get_payment_method import get_payment_method
-from utils.rtnet import RtnetAPI
+from utils.rtnet import RtnetAPI, rtnet_clients
 
 router = APIRouter()
 
+rating_users_adapter = TypeAdapter(list[RatingUser])
+
 
 @router.get(
     "/profiles/init",
@@ -54,28 +61,33 @@ async def rating(
     if limit > 100:
         raise HTTPException(status_code=400, detail="Limit can't exceed 100")
 
-    user = await UsersRepository.get_or_raise_by_id(info.user.id)
-    await set_user_rating(user.id, await GameRepository.get_user_rating(user.id))
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Offset can't be negative")
 
-    user_place_data = await redis.zrevrank("rating", user.id, withscore=True)
-    user_place, user_points = user_place_data[0] + 1, int(user_place_data[1])
+    user_place_data, cached_page, rating_list = await get_user_rating_place_and_page(info.user.id, offset, limit)
 
-    rating_list = [
-        (int(user_id), int(score)) for user_id, score in
-        await redis.zrange("rating", offset, limit, desc=True, withscores=True)
-    ]
+    # a cached page only saves reading and rendering the profile cards of its users
+    cards = await UsersRepository.get_profile_cards(
+        [info.user.id] + ([user_id for user_id, _ in rating_list] if cached_page is None else [])
+    )
+    user = cards.get(info.user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
-    account_ids = [user.id] + [user_id for user_id, _ in rating_list]
-    accounts_dict = {account.id: account for account in await UsersRepository.get_by_ids(account_ids)}
+    if user_place_data is None:
+        await init_user_rating(user.id)
+        user_place_data = await get_user_rating_place(user.id)
+    user_place, user_points = user_place_data
 
-    users = [
-        await user_to_model_rating_user(
-            accounts_dict[user_id],
-            await redis.zrevrank("rating", user_id) + 1,
-            score
-        )
-        for user_id, score in rating_list
-    ]
+    if cached_page is not None:
+        users = rating_users_adapter.validate_json(cached_page)
+    else:
+        users = [
+            await user_to_model_rating_user(cards[user_id], offset + i + 1, score)
+            for i, (user_id, score) in enumerate(rating_list)
+            if user_id in cards
+        ]
+        await set_rating_page(offset, limit, rating_users_adapter.dump_json(users), settings.RATING_PAGE_CACHE_TTL)
 
     return Rating(users=users, user=await user_to_model_rating_user(user, user_place, user_points))
 
@@ -107,9 +119,9 @@ async def bet(
         bet_model: GameBet,
         info: WebAppInitData = Depends(get_web_app_info),
 ):
-    bet_game = await GameRepository.bet(info.user.id, bet_model.game_id, bet_model)
+    bet_game, balance, balance_usdt = await GameRepository.bet(info.user.id, bet_model.game_id, bet_model)
 
-    return await bet_game_to_model_game_bet(bet_game)
+    return await bet_game_to_model_game_bet(bet_game, balance, balance_usdt)
 
 
 @router.get(
@@ -118,13 +130,25 @@ async def bet(
 )
 @transaction()
 async def referral(
+        offset: int = 0,
+        limit: int = 100,
         info: WebAppInitData = Depends(get_web_app_info),
 ):
-    user = await UsersRepository.get_or_raise_by_id(info.user.id)
-    referrals = await UsersRepository.get_referrals_by_ref_id(user.id)
-    referrals_rewards = await UsersRepository.get_referral_rewards(referrals)
+    if limit > 500:
+        raise HTTPException(status_code=400, detail="Limit can't exceed 500")
 
-    return await referrals_to_model_referral(referrals_rewards)
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Offset can't be negative")
+
+    referrals_rewards, summary = await asyncio.gather(
+        in_new_session(UsersRepository.get_referral_rewards, info.user.id, limit, offset),
+        in_new_session(UsersRepository.get_referral_summary, info.user.id),
+    )
+    cards = await UsersRepository.get_profile_cards([info.user.id] + [user_id for user_id, _, _ in referrals_rewards])
+    if info.user.id not in cards:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return await referrals_to_model_referral(referrals_rewards, summary, cards)
 
 
 @router.post(
@@ -149,7 +173,9 @@ async def complete_task(
 @transaction()
 async def game_info(info: WebAppInitData = Depends(get_web_app_info)):
     user = await UsersRepository.get_or_raise_by_id(info.user.id)
-    next_game = await GameRepository.get_next_game()
+    # a cache miss and the stats below each take a session of their own
+    await release_connection()
+    next_game = await GameRepository.get_next_game_cached()
 
     if next_game is None:
         raise HTTPException(status_code=404, detail="Game not found")
@@ -216,29 +242,11 @@ async def withdrawal(
         cf_connecting_ip=x_ip,
     )
 
-    if withdrawal_model.currency == "RUB" and withdrawal_model.payment_method in ("Sber", "T-Bank"):
-        rtnet = RtnetAPI(
-            settings.RTNET_RUB_PROJECT_ID,
-            settings.RTNET_RUB_API_ID,
-            settings.RTNET_RUB_PRIVATE_KEY,
-            settings.RTNET_BASE_URL,
-        )
-        await rtnet.create_withdrawal(
-            client_id=user.id,
-            external_id=str(withdrawal_model.id),
-            payment_method=get_payment_method(operation.payment_method),
-            amount=int(withdrawal_model.amount),
-            client_card_number=withdrawal_model.card_number,
-            ext_ip=x_ip,
-        )
-    elif withdrawal_model.currency == "UZS" and withdrawal_model.payment_method in ("Humo", "Uzcard"):
-        rtnet = RtnetAPI(
-            settings.RTNET_UZS_PROJECT_ID,
-            settings.RTNET_UZS_API_ID,
-            settings.RTNET_UZS_PRIVATE_KEY,
-            settings.RTNET_BASE_URL,
-        )
-        await rtnet.create_withdrawal(
+    if (
+            withdrawal_model.currency == "RUB" and withdrawal_model.payment_method in ("Sber", "T-Bank")
+            or withdrawal_model.currency == "UZS" and withdrawal_model.payment_method in ("Humo", "Uzcard")
+    ):
+        await rtnet_clients.get(withdrawal_model.currency).create_withdrawal(
             client_id=user.id,
             external_id=str(withdrawal_model.id),
             payment_method=get_payment_method(operation.payment_method),
@@ -262,11 +270,39 @@ async def withdrawal(
 async def bets(info: WebAppInitData = Depends(get_web_app_info), ):
     user = await UsersRepository.get_or_raise_by_id(info.user.id)
 
-    return [
-        ProfileBetHistory.model_validate(
-            bet_db, from_attributes=True
-        ) for bet_db in await GameRepository.get_bets_by_user_id(user.id)
-    ]
+    return Response(
+        bet_history_adapter.dump_json(bet_history_to_model(await GameRepository.get_bet_history(user.id))),
+        media_type="application/json",
+    )
+
+
+@router.get(
+    "/profiles/bets/page",
+    response_model=ProfileBetHistoryPage,
+)
+@transaction()
+async def bets_page(
+        limit: int = 50,
+        cursor: str | None = None,
+        since: str | None = None,
+        info: WebAppInitData = Depends(get_web_app_info),
+):
+    """Newest bets first, `cursor` pages to older bets and `since` asks for only the bets placed after a page."""
+    if not 0 < limit <= 100:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 100")
+
+    if cursor is not None and since is not None:
+        raise HTTPException(status_code=400, detail="Use either cursor or since")
+
+    rows = await GameRepository.get_bet_history(
+        info.user.id,
+        limit=limit,
+        before=decode_cursor(cursor) if cursor is not None else None,
+        since=decode_cursor(since) if since is not None else None,
+    )
+    page = bet_history_to_model_page(rows, limit, since)
+
+    return Response(page.model_dump_json(), media_type="application/json")
 
 
 @router.post(
@@ -303,27 +339,11 @@ async def deposit(
         cf_connecting_ip=x_ip,
     )
 
-    if deposit_model.currency == "RUB" and deposit_model.payment_method in ("Sber", "T-Bank"):
-        rtnet = RtnetAPI(
-            settings.RTNET_RUB_PROJECT_ID,
-            settings.RTNET_RUB_API_ID,
-            settings.RTNET_RUB_PRIVATE_KEY,
-            settings.RTNET_BASE_URL,
-        )
-        response = await rtnet.create_deposit(
-            client_id=user.id,
-            external_id=str(deposit_model.id),
-            payment_method=get_payment_method(operation.payment_method),
-            amount=int(deposit_model.amount),
-        )
-    elif deposit_model.currency == "UZS" and deposit_model.payment_method in ("Humo", "Uzcard"):
-        rtnet = RtnetAPI(
-            settings.RTNET_UZS_PROJECT_ID,
-            settings.RTNET_UZS_API_ID,
-            settings.RTNET_UZS_PRIVATE_KEY,
-            settings.RTNET_BASE_URL,
-        )
-        response = await rtnet.create_deposit(
+    if (
+            deposit_model.currency == "RUB" and deposit_model.payment_method in ("Sber", "T-Bank")
+            or deposit_model.currency == "UZS" and deposit_model.payment_method in ("Humo", "Uzcard")
+    ):
+        response = await rtnet_clients.get(deposit_model.currency).create_deposit(
             client_id=user.id,
             external_id=str(deposit_model.id),
             payment_method=get_payment_method(operation.payment_method),
@@ -340,10 +360,16 @@ async def deposit(
 )
 @transaction()
 async def callback(
+        request: Request,
         data: InvoiceModel,
         sign: typing.Annotated[str, Header(alias="Authorization1")],
 ):
-    # validate = RtnetAPI.validate(json.dumps(data, separators=(",", ":")), sign.split(" ")[-1])
+    # signed over the exact bytes RTnet sent, a re-serialized body would not match
+    if settings.RTNET_VERIFY_CALLBACKS and not await RtnetAPI.validate(
+            (await request.body()).decode(), sign.split(" ")[-1]
+    ):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
     operation = await FinanceOperationRepository.get_by_id(data.ExternalId)
     if operation is None:
         raise HTTPException(status_code=200, detail="Operation not found")
@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 from typing import Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ConfigDict
 
 OperationTypeLiteral = Literal["WITHDRAWAL", "DEPOSIT"]
 CurrencyLiteral = Literal["USDT", "WORDS"]
@@ -27,6 +27,8 @@ class InitGameResponse(GameResponse):
 
 
 class Tasks(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     id: int
     icon: str
     title: str
@@ -169,6 +171,12 @@ class ProfileBetHistory(BaseModel):
     time_created: datetime
 
 
+class ProfileBetHistoryPage(BaseModel):
+    bets: list[ProfileBetHistory]
+    next_cursor: str | None = Field(description="Cursor for the page of older bets, null after the oldest one")
+    since_cursor: str | None = Field(description="Cursor to ask for only the bets newer than this page")
+
+
 class StarsPaymentRequest(BaseModel):
     amount_stars: int
 
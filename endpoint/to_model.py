@@ -1,15 +1,27 @@
-from core import get_token_price
-from db.database import transaction
-from db.models import User, Game, UsersGames, UserReferral
+import asyncio
+from typing import Sequence
+
+from pydantic import TypeAdapter
+from sqlalchemy import Row
+
+from core import ProfileCard, ReferralSummary
+from db.database import transaction, in_new_session, release_connection
+from db.models import User, Game, UsersGames
 from db.repository import GameRepository, UsersRepository
 from endpoint.models import Init, RatingUser, GameResponse, GameBetResponse, ReferralResponse, ReferralUserResponse, \
-    InitGameResponse
+    InitGameResponse, ProfileBetHistory, ProfileBetHistoryPage
+from utils.cursor import encode_cursor
 
 
 @transaction()
 async def user_to_model_init(user: User):
-    next_game = await GameRepository.get_next_game()
-    user_daily_task_day = await UsersRepository.get_user_daily_task_day(user.id)
+    await release_connection()
+    # independent reads, each database one in a session of its own
+    next_game, previous_game_results, state = await asyncio.gather(
+        in_new_session(next_game_to_model_init_game, user.id),
+        in_new_session(UsersRepository.get_previous_game_wins, user.id),
+        UsersRepository.get_init_state(user.id),
+    )
 
     return Init(
         id=user.id,
@@ -18,21 +30,21 @@ async def user_to_model_init(user: User):
         avatar=user.avatar,
         balance=int(user.balance),
         is_admin=user.is_admin,
-        previous_game_results=await UsersRepository.get_previous_game_wins(user.id),
-        tasks=await UsersRepository.get_updates_task_status(user.id),
+        previous_game_results=previous_game_results,
+        tasks=await UsersRepository.get_updates_task_status(user.id, state),
         wins=user.wins,
-        next_game=(await game_to_model_init_game(next_game, user.id)) if next_game else None,
+        next_game=next_game,
         balance_usdt=user.balance_usdt,
-        current_token_price=await get_token_price(),
-        daily_task_day=user_daily_task_day,
+        current_token_price=state.token_price,
+        daily_task_day=state.daily_task_day,
     )
 
 
-async def user_to_model_rating_user(user: User, place: int, points: int) -> RatingUser:
+async def user_to_model_rating_user(card: ProfileCard, place: int, points: int) -> RatingUser:
     return RatingUser(
-        id=user.id,
-        full_name=user.full_name,
-        avatar=user.avatar,
+        id=card.id,
+        full_name=card.full_name,
+        avatar=card.avatar,
         points=points,
         place=place,
     )
@@ -46,10 +58,18 @@ async def game_to_model(game: Game) -> GameResponse:
     )
 
 
+@transaction()
+async def next_game_to_model_init_game(user_id: int) -> InitGameResponse | None:
+    next_game = await GameRepository.get_next_game_cached()
+    return (await game_to_model_init_game(next_game, user_id)) if next_game else None
+
+
 @transaction()
 async def game_to_model_init_game(game: Game, user_id: int) -> InitGameResponse:
-    stats = await GameRepository.get_stats_of_game(game.id)
-    user_bet = await GameRepository.get_user_game_bets(game.id, user_id)
+    stats, user_bet = await asyncio.gather(
+        in_new_session(GameRepository.get_stats_of_game, game.id),
+        in_new_session(GameRepository.get_user_game_bets, game.id, user_id),
+    )
     return InitGameResponse(
         **((await game_to_model(game)).model_dump()),
         stats=stats,
@@ -58,44 +78,68 @@ async def game_to_model_init_game(game: Game, user_id: int) -> InitGameResponse:
     )
 
 
-async def bet_game_to_model_game_bet(bet_game: UsersGames) -> GameBetResponse:
-    user_bet = await GameRepository.get_user_game_bets(bet_game.game.id, bet_game.user.id)
+async def bet_game_to_model_game_bet(bet_game: UsersGames, balance: float, balance_usdt: float) -> GameBetResponse:
+    user_bet = await GameRepository.get_user_game_bets(bet_game.game_id, bet_game.user_id)
+    if bet_game.id is None:
+        # a queued bet, `utils.bet_queue` hasn't written it to SQL yet
+        choice_bet = user_bet[bet_game.currency][bet_game.choose]
+        user_bet[bet_game.currency][bet_game.choose] = {
+            **choice_bet, "total_rate": choice_bet["total_rate"] + bet_game.total_rate
+        }
     return GameBetResponse(
         game=await game_to_model(bet_game.game),
         currency=bet_game.currency,  # type: ignore
         amount=bet_game.total_rate,
         choice=bet_game.choose,  # type: ignore
-        actual_balance_usdt=bet_game.user.balance_usdt,
-        actual_balance=int(bet_game.user.balance),
+        actual_balance_usdt=balance_usdt,
+        actual_balance=int(balance),
         stats=await GameRepository.get_stats_of_game(bet_game.game_id),
         user_bet=user_bet
     )
 
 
-async def referrals_to_model_referral(referrals: list[UserReferral]) -> ReferralResponse:
-    total_usdt = sum([ref.amount for ref in referrals if ref.currency == "USDT"])
-    total_words = sum([ref.amount for ref in referrals if ref.currency == "WORDS"])
-
-    referrals_group: dict[int, list[UserReferral]] = {}
-    for ref in referrals:
-        referrals_group[ref.user_id] = referrals_group.get(ref.user_id, []) + [ref]
-
-    referrals_group_sum: list[tuple[str, int, int]] = []
-    for value in referrals_group.values():
-        total_usdt_user = sum([ref.amount for ref in value if ref.currency == "USDT"])
-        total_words_user = sum([ref.amount for ref in value if ref.currency == "WORDS"])
+bet_history_adapter = TypeAdapter(list[ProfileBetHistory])
+
+
+def bet_history_to_model(rows: Sequence[Row]) -> list[ProfileBetHistory]:
+    """Rows of `GameRepository.get_bet_history`, validated in one pass by the prebuilt adapter."""
+    return bet_history_adapter.validate_python([
+        {
+            "id": bet_id,
+            "total_rate": total_rate,
+            "currency": currency,
+            "choose": choose,
+            "win_total_rate": win_total_rate,
+            "time_created": time_created,
+            "game": {"id": game_id, "date_game": date_game, "course": course, "course_at_computed": course_at_computed},
+        }
+        for bet_id, total_rate, currency, choose, win_total_rate, time_created, game_id, date_game, course,
+        course_at_computed in rows
+    ])
+
+
+def bet_history_to_model_page(
+        rows: Sequence[Row], limit: int, since: str | None,
+) -> ProfileBetHistoryPage:
+    return ProfileBetHistoryPage(
+        bets=bet_history_to_model(rows),
+        next_cursor=encode_cursor(rows[-1].date_game, rows[-1].id) if len(rows) == limit and since is None else None,
+        since_cursor=encode_cursor(rows[0].date_game, rows[0].id) if rows else since,
+    )
 
-        referrals_group_sum.append((value[0].user.full_name, total_usdt_user, total_words_user))
 
+async def referrals_to_model_referral(
+        referrals: Sequence[Row], summary: ReferralSummary, cards: dict[int, ProfileCard],
+) -> ReferralResponse:
     return ReferralResponse(
-        total_usdt=total_usdt,
-        total_words=total_words,
-        total_users=len(referrals_group_sum),
+        total_usdt=summary.total_usdt,
+        total_words=summary.total_words,
+        total_users=summary.total_users,
         referrals=[
             ReferralUserResponse(
-                full_name=value[0],
-                usdt=value[1],
-                words=value[2],
-            ) for value in referrals_group_sum
+                full_name=cards[user_id].full_name if user_id in cards else "",
+                usdt=usdt,
+                words=words,
+            ) for user_id, usdt, words in referrals
         ]
     )
@@ -9,10 +9,17 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 
-from core import settings
+from core import settings, close_telegram, get_telegram_metrics, shutdown_thumbnail_pool
+from db.repository import UsersRepository
 from endpoint.http import router
+from utils.avatars import avatar_queue
+from utils.bet_queue import task_bet_queue_consumer
+from utils.games_cache import task_games_cache_listener
+from utils.rtnet import rtnet_clients
+from utils.rtnet_crypto import shutdown_crypto_pool
 from utils.get_token_price import task_get_token_price
-from utils.scheduler_games_task import scheduler_games_task
+from utils.scheduler_games_task import scheduler_games_task, scheduler_game_stats_task
+from utils.tasks import task_watch_tasks_catalog
 
 app = FastAPI()
 app.include_router(router, prefix="/api")
@@ -31,6 +38,11 @@ async def index():
     return "OK"
 
 
+@app.get("/metrics/telegram")
+async def telegram_metrics():
+    return get_telegram_metrics()
+
+
 config = uvicorn.Config(
     "main:app", "0.0.0.0", log_level=4, workers=1, reload=False,
 )
@@ -56,11 +68,48 @@ async def start_scheduler_games(tg: TaskGroup):
     tg.cancel_scope.cancel()
 
 
+async def start_scheduler_game_stats(tg: TaskGroup):
+    await scheduler_game_stats_task()
+    tg.cancel_scope.cancel()
+
+
+async def start_watch_tasks_catalog(tg: TaskGroup):
+    await task_watch_tasks_catalog()
+    tg.cancel_scope.cancel()
+
+
+async def start_games_cache_listener(tg: TaskGroup):
+    await task_games_cache_listener()
+    tg.cancel_scope.cancel()
+
+
+async def start_avatar_queue(tg: TaskGroup):
+    await avatar_queue.run(UsersRepository.set_avatar)
+    tg.cancel_scope.cancel()
+
+
+async def start_bet_queue_consumer(tg: TaskGroup):
+    await task_bet_queue_consumer()
+    tg.cancel_scope.cancel()
+
+
 async def main():
-    async with anyio.create_task_group() as tg:
-        tg.start_soon(start_server, tg, server.serve)
-        tg.start_soon(start_get_token_price, tg)
-        tg.start_soon(start_scheduler_games, tg)
+    try:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(start_server, tg, server.serve)
+            tg.start_soon(start_get_token_price, tg)
+            tg.start_soon(start_scheduler_games, tg)
+            tg.start_soon(start_scheduler_game_stats, tg)
+            tg.start_soon(start_watch_tasks_catalog, tg)
+            tg.start_soon(start_games_cache_listener, tg)
+            tg.start_soon(start_avatar_queue, tg)
+            if settings.BET_INGESTION_MODE == "queue":
+                tg.start_soon(start_bet_queue_consumer, tg)
+    finally:
+        await close_telegram()
+        await rtnet_clients.close()
+        shutdown_thumbnail_pool()
+        shutdown_crypto_pool()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,72 @@
+"""Add indexes for the games, bets and referrals lookups
+
+Revision ID: 148a88fe6587
+Revises: 7c51c96565f5
+Create Date: 2026-10-18 10:12:03.481526
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '148a88fe6587'
+down_revision: Union[str, None] = '7c51c96565f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # racing set_or_create_games and the scheduler could create a date twice, the empty copies go
+    op.execute(
+        """
+        DELETE FROM games g
+        WHERE NOT EXISTS (SELECT 1 FROM users_games_m2m ug WHERE ug.game_id = g.id)
+          AND EXISTS (
+            SELECT 1 FROM games d
+            WHERE d.date_game = g.date_game
+              AND d.id != g.id
+              AND (d.id < g.id OR EXISTS (SELECT 1 FROM users_games_m2m ug WHERE ug.game_id = d.id))
+          )
+        """
+    )
+    duplicates = op.get_bind().execute(
+        sa.text(
+            """
+            SELECT date_game, array_agg(id ORDER BY id) FROM games
+            WHERE date_game IS NOT NULL
+            GROUP BY date_game
+            HAVING count(*) > 1
+            """
+        )
+    ).all()
+    if duplicates:
+        raise RuntimeError(
+            "games.date_game can't be made unique, these dates have several games with bets, "
+            "move the bets to one of them and delete the others: "
+            + "; ".join(f"{date_game.isoformat()}: {ids}" for date_game, ids in duplicates)
+        )
+
+    op.create_index('ix_games_date_game', 'games', ['date_game'], unique=True)
+    op.create_index(
+        'ix_games_uncomputed_date_game', 'games', ['date_game'],
+        postgresql_where=sa.text('is_computed IS false'),
+    )
+    op.create_index(
+        'ix_users_games_m2m_game_id_currency_choose', 'users_games_m2m', ['game_id', 'currency', 'choose'],
+    )
+    op.create_index('ix_users_games_m2m_user_id_game_id', 'users_games_m2m', ['user_id', 'game_id'])
+    op.create_index('ix_users_referrals_user_id', 'users_referrals', ['user_id'])
+    op.create_index('ix_users_referrals_ref_id', 'users_referrals', ['ref_id'])
+    op.create_index('ix_users_ref_id', 'users', ['ref_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_ref_id', table_name='users')
+    op.drop_index('ix_users_referrals_ref_id', table_name='users_referrals')
+    op.drop_index('ix_users_referrals_user_id', table_name='users_referrals')
+    op.drop_index('ix_users_games_m2m_user_id_game_id', table_name='users_games_m2m')
+    op.drop_index('ix_users_games_m2m_game_id_currency_choose', table_name='users_games_m2m')
+    op.drop_index('ix_games_uncomputed_date_game', table_name='games')
+    op.drop_index('ix_games_date_game', table_name='games')
@@ -0,0 +1,25 @@
+"""Add users.avatar_thumbnail
+
+Revision ID: 2d9e4c1b7a30
+Revises: 148a88fe6587
+Create Date: 2026-10-18 14:27:45.913208
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '2d9e4c1b7a30'
+down_revision: Union[str, None] = '148a88fe6587'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('avatar_thumbnail', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'avatar_thumbnail')
@@ -0,0 +1,27 @@
+"""Add users_games_m2m.stream_id for idempotent bets stream inserts
+
+Revision ID: 5e8b3c0f7d12
+Revises: 9a4f2e6d81c5
+Create Date: 2026-10-18 18:40:27.915304
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8b3c0f7d12'
+down_revision: Union[str, None] = '9a4f2e6d81c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users_games_m2m', sa.Column('stream_id', sa.String(), nullable=True))
+    op.create_index(op.f('ix_users_games_m2m_stream_id'), 'users_games_m2m', ['stream_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_users_games_m2m_stream_id'), table_name='users_games_m2m')
+    op.drop_column('users_games_m2m', 'stream_id')
@@ -0,0 +1,50 @@
+"""Add referral_earnings with the totals of users_referrals
+
+Revision ID: 9a4f2e6d81c5
+Revises: 2d9e4c1b7a30
+Create Date: 2026-10-18 16:05:12.240871
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f2e6d81c5'
+down_revision: Union[str, None] = '2d9e4c1b7a30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('referral_earnings',
+    sa.Column('ref_id', sa.BigInteger(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('amount', sa.Float(), server_default='0', nullable=False),
+    sa.Column('currency', sa.String(), nullable=False),
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('time_created', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('time_updated', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['ref_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('ref_id', 'user_id', 'currency', name='uq_referral_earnings_ref_id_user_id_currency')
+    )
+    op.create_index(op.f('ix_referral_earnings_id'), 'referral_earnings', ['id'], unique=True)
+
+    # ids follow the first reward of each referral, /profiles/referral lists them in that order
+    op.execute(
+        """
+        INSERT INTO referral_earnings (ref_id, user_id, currency, amount)
+        SELECT ref_id, user_id, currency, sum(amount)
+        FROM users_referrals
+        GROUP BY ref_id, user_id, currency
+        ORDER BY min(id)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_referral_earnings_id'), table_name='referral_earnings')
+    op.drop_table('referral_earnings')
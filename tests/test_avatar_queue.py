@@ -0,0 +1,135 @@
+import asyncio
+import random
+import time
+from contextlib import suppress
+from io import BytesIO
+
+import pytest
+from sqlalchemy import delete
+
+import core._s3
+from core import UserAvatar, redis, shutdown_thumbnail_pool
+from db.database import SessionLocal
+from db.models import User
+from db.repository import UsersRepository
+from utils.avatars import AvatarQueue
+
+pytestmark = pytest.mark.anyio
+
+RETRY_BACKOFF = 0.05
+
+
+@pytest.fixture
+def s3_objects(monkeypatch) -> dict[str, bytes]:
+    """In-memory bucket instead of MinIO, only the Telegram side of the copy is under test."""
+    objects: dict[str, bytes] = {}
+
+    async def object_exists(key: str) -> bool:
+        return key in objects
+
+    async def put_immutable_object(key: str, data: BytesIO, length: int, extension: str) -> None:
+        objects[key] = data.read(length)
+
+    monkeypatch.setattr(core._s3, "object_exists", object_exists)
+    monkeypatch.setattr(core._s3, "put_immutable_object", put_immutable_object)
+    yield objects
+    shutdown_thumbnail_pool()
+
+
+@pytest.fixture
+async def avatar_queue(telegram, s3_objects):
+    queue = AvatarQueue(workers=2, max_attempts=3, retry_backoff=RETRY_BACKOFF, recheck_interval=60)
+    copied: list[tuple[int, UserAvatar]] = []
+
+    async def on_avatar(user_id: int, avatar: UserAvatar) -> None:
+        copied.append((user_id, avatar))
+
+    workers = asyncio.create_task(queue.run(on_avatar))
+    yield queue, copied
+
+    workers.cancel()
+    with suppress(asyncio.CancelledError):
+        await workers
+
+
+def odd_user_id() -> int:
+    # the fake Telegram has photos only for odd ids
+    return random.randrange(10 ** 12, 2 * 10 ** 12) | 1
+
+
+async def test_duplicate_enqueue_is_copied_once(avatar_queue, telegram, s3_objects):
+    queue, copied = avatar_queue
+    user_id = odd_user_id()
+
+    assert queue.enqueue(user_id)
+    assert not queue.enqueue(user_id)
+    await queue.join()
+
+    assert [copied_user_id for copied_user_id, _ in copied] == [user_id]
+    assert telegram["calls"]["getuserprofilephotos"] == 1
+    # the avatar and its thumbnail
+    assert len(s3_objects) == 2
+    # done jobs leave the dedupe set, the user can be queued again
+    assert queue.enqueue(user_id)
+    await queue.join()
+
+
+async def test_failed_copy_is_retried_with_backoff(avatar_queue, telegram):
+    queue, copied = avatar_queue
+    telegram["failures"]["getuserprofilephotos"] = 2
+
+    started = time.monotonic()
+    queue.enqueue(odd_user_id())
+    await queue.join()
+
+    assert len(copied) == 1
+    assert telegram["calls"]["getuserprofilephotos"] == 3
+    assert time.monotonic() - started >= RETRY_BACKOFF + RETRY_BACKOFF * 2
+
+
+async def test_copy_is_dropped_after_max_attempts(avatar_queue, telegram):
+    queue, copied = avatar_queue
+    telegram["failures"]["getuserprofilephotos"] = 10
+
+    queue.enqueue(odd_user_id())
+    await queue.join()
+
+    assert copied == []
+    assert telegram["calls"]["getuserprofilephotos"] == 3
+
+
+async def test_missing_avatar_is_requeued_once_per_interval(avatar_queue, redis_server):
+    queue, copied = avatar_queue
+    user_id = odd_user_id()
+
+    try:
+        assert await queue.enqueue_missing(user_id)
+        await queue.join()
+        assert not await queue.enqueue_missing(user_id)
+    finally:
+        await redis.delete(f"avatar:recheck:{user_id}")
+
+    assert len(copied) == 1
+
+
+async def test_existing_user_without_avatar_is_requeued(avatar_queue, database, redis_server, monkeypatch):
+    queue, copied = avatar_queue
+    monkeypatch.setattr("db.repository.avatar_queue", queue)
+    user = User(id=odd_user_id(), full_name="avatar queue")
+    async with SessionLocal() as db:
+        db.add(user)
+        await db.commit()
+
+    try:
+        for _ in range(2):
+            existing = await UsersRepository.get_or_create(user.id, None, user.full_name, None)
+            assert existing.avatar is None
+            await queue.join()
+    finally:
+        await redis.delete(f"avatar:recheck:{user.id}")
+        async with SessionLocal() as db:
+            await db.execute(delete(User).where(User.id == user.id))
+            await db.commit()
+
+    # `on_avatar` here doesn't store it, the second init finds the user still without one
+    assert [copied_user_id for copied_user_id, _ in copied] == [user.id]
@@ -0,0 +1,88 @@
+import asyncio
+import random
+from datetime import datetime, UTC, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select
+
+from core import settings
+from db.database import SessionLocal
+from db.models import Game, User, UsersGames
+from db.repository import GameRepository
+from endpoint.models import GameBet
+
+pytestmark = pytest.mark.anyio
+
+BETS = 300
+START_BALANCE = 1000
+START_BALANCE_USDT = 100
+
+
+@pytest.fixture
+async def user_and_game(database):
+    user = User(
+        id=random.randint(10 ** 12, 2 * 10 ** 12),
+        full_name="bet concurrency",
+        balance=START_BALANCE,
+        balance_usdt=START_BALANCE_USDT,
+    )
+    # far in the future, never the next game of an app sharing the database
+    game = Game(
+        date_game=datetime.now(UTC) + timedelta(days=3650, seconds=random.randint(0, 10 ** 7)),
+        course=1.0,
+    )
+    async with SessionLocal() as db:
+        db.add_all([user, game])
+        await db.commit()
+
+    yield user, game
+
+    async with SessionLocal() as db:
+        await db.execute(delete(UsersGames).where(UsersGames.user_id == user.id))
+        await db.execute(delete(Game).where(Game.id == game.id))
+        await db.execute(delete(User).where(User.id == user.id))
+        await db.commit()
+
+
+@pytest.mark.parametrize(
+    "currency, start, amount",
+    [("WORDS", START_BALANCE, 7), ("USDT", START_BALANCE_USDT, 0.5)],
+)
+async def test_parallel_bets_never_overdraw(user_and_game, monkeypatch, currency, start, amount):
+    monkeypatch.setattr(settings, "BET_INGESTION_MODE", "direct")
+    user, game = user_and_game
+    balance_column = User.balance_usdt if currency == "USDT" else User.balance
+
+    results = await asyncio.gather(
+        *[
+            GameRepository.bet(user.id, game.id, GameBet(game_id=game.id, currency=currency, amount=amount, choice="YES"))
+            for _ in range(BETS)
+        ],
+        return_exceptions=True,
+    )
+    accepted = [result for result in results if not isinstance(result, BaseException)]
+    rejected = [result for result in results if isinstance(result, BaseException)]
+
+    assert all(isinstance(e, HTTPException) and e.detail == "Not enough money" for e in rejected), rejected
+    assert len(accepted) == int(start // amount)
+
+    async with SessionLocal() as db:
+        balance = (await db.execute(select(balance_column).where(User.id == user.id))).scalar_one()
+        bets_count, bets_sum = (
+            await db.execute(
+                select(func.count(UsersGames.id), func.coalesce(func.sum(UsersGames.total_rate), 0))
+                .where(UsersGames.user_id == user.id, UsersGames.game_id == game.id)
+            )
+        ).one()
+
+    assert balance == start - amount * len(accepted)
+    assert balance >= 0
+    assert bets_count == len(accepted)
+    assert bets_sum == amount * len(accepted)
+
+    # every accepted bet saw the balance right after its own debit, no debit was lost or applied twice
+    reported = sorted(
+        (balance_usdt if currency == "USDT" else balance_words) for _, balance_words, balance_usdt in accepted
+    )
+    assert reported == sorted(start - amount * i for i in range(1, len(accepted) + 1))
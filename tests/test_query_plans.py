@@ -0,0 +1,51 @@
+from typing import Any, Awaitable, Callable
+
+import pytest
+from sqlalchemy import event
+
+from db.database import engine
+from db.repository import GameRepository, UsersRepository
+
+pytestmark = pytest.mark.anyio
+
+
+async def explain(call: Callable[[], Awaitable[Any]]) -> str:
+    """
+    The plan of the single statement `call` runs. Sequential scans are disabled,
+    on a small test database they are cheaper than any index and would hide whether one is usable.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        await call()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert len(statements) == 1, statements
+    statement, parameters = statements[0]
+
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return "\n".join(row[0] for row in plan)
+
+
+@pytest.mark.parametrize(
+    "call, index",
+    [
+        (lambda: GameRepository.game_to_compute(), "ix_games_uncomputed_date_game"),
+        (lambda: GameRepository.get_next_game(), "ix_games_date_game"),
+        (lambda: GameRepository.compute_stats_of_game(1), "ix_users_games_m2m_game_id_currency_choose"),
+        (lambda: GameRepository.get_user_game_bets(1, 1), "ix_users_games_m2m_user_id_game_id"),
+        (lambda: UsersRepository.get_referral_rewards(1, 100), "uq_referral_earnings_ref_id_user_id_currency"),
+    ],
+    ids=["game_to_compute", "get_next_game", "compute_stats_of_game", "get_user_game_bets", "get_referral_rewards"],
+)
+async def test_hot_queries_use_their_index(database, call, index):
+    plan = await explain(call)
+
+    assert index in plan, plan
@@ -0,0 +1,130 @@
+import base64
+import hashlib
+import json
+from typing import AsyncIterator
+
+import httpx
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from ecdsa.keys import SigningKey
+from fastapi import FastAPI
+
+from core import settings
+from db.repository import FinanceOperationRepository
+from endpoint.http import router
+from utils import fake_rtnet
+from utils.rtnet import RtnetAPI, RtnetRegistry
+from utils.rtnet_crypto import shutdown_crypto_pool
+
+pytestmark = pytest.mark.anyio
+
+PRIVATE_KEY = fake_rtnet.generate_private_key()
+
+
+@pytest.fixture
+async def rtnet(monkeypatch) -> AsyncIterator[tuple[RtnetRegistry, web.Application]]:
+    server = TestServer(fake_rtnet.create_app())
+    await server.start_server()
+    monkeypatch.setattr(settings, "RTNET_BASE_URL", str(server.make_url("")).rstrip("/"))
+    monkeypatch.setattr(settings, "RTNET_RUB_PRIVATE_KEY", PRIVATE_KEY)
+    monkeypatch.setattr(settings, "RTNET_RUB_API_ID", "test-api")
+    monkeypatch.setattr(settings, "RTNET_RUB_PROJECT_ID", "test-project")
+    clients = RtnetRegistry()
+
+    yield clients, server.app
+
+    await clients.close()
+    await server.close()
+    shutdown_crypto_pool()
+
+
+@pytest.fixture
+async def callback_client(monkeypatch) -> AsyncIterator[httpx.AsyncClient]:
+    public_key = base64.b64encode(fake_rtnet.callback_key.get_verifying_key().to_der()).decode()
+    monkeypatch.setattr(RtnetAPI, "PUBLIC_KEY", public_key)
+    monkeypatch.setattr(settings, "RTNET_VERIFY_CALLBACKS", True)
+
+    async def get_by_id(operation_id: str) -> None:
+        return None
+
+    # an unknown operation is answered 200 without touching the database, the signature is checked before
+    monkeypatch.setattr(FinanceOperationRepository, "get_by_id", get_by_id)
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    shutdown_crypto_pool()
+
+
+def assert_signed(body: bytes, signature: str, api_id: str) -> None:
+    verifying_key = SigningKey.from_der(base64.b64decode(PRIVATE_KEY)).get_verifying_key()
+    assert verifying_key.verify(
+        bytes.fromhex(signature), (body.decode() + api_id).lower().encode(), hashfunc=hashlib.sha512
+    )
+
+
+async def test_requests_are_signed_over_the_sent_body_on_one_reused_session(rtnet):
+    clients, app = rtnet
+    client = clients.get("RUB")
+
+    invoice = await client.create_deposit(client_id=1, external_id="deposit-1", payment_method="Sber", amount=1000)
+    session = client.session
+    await client.create_withdrawal(
+        client_id=1, external_id="withdrawal-1", payment_method="Sber", amount=500,
+        client_card_number="2200000000000000", ext_ip="127.0.0.1",
+    )
+
+    assert invoice.externalId == "deposit-1"
+    assert clients.get("RUB") is client
+    assert client.session is session
+    # keep-alive, both requests went over the same connection
+    assert len(app["connections"]) == 1
+
+    assert [path for path, *_ in app["requests"]] == [
+        "/api/merchant/Invoice/Create",
+        "/api/merchant/Withdrawal/Create",
+    ]
+    for _, body, signature, api_id in app["requests"]:
+        assert api_id == "test-api"
+        assert_signed(body, signature, api_id)
+
+
+async def test_close_reopens_the_session_on_next_use(rtnet):
+    clients, app = rtnet
+    client = clients.get("RUB")
+
+    await client.create_deposit(client_id=1, external_id="deposit-1", payment_method="Sber", amount=1000)
+    await clients.close()
+    await client.create_deposit(client_id=1, external_id="deposit-2", payment_method="Sber", amount=1000)
+
+    assert len(app["requests"]) == 2
+
+
+async def test_signed_callback_is_accepted(callback_client):
+    body, headers = fake_rtnet.paid_callback(1, {"externalId": "deposit-1", "amount": 1000})
+
+    response = await callback_client.post("/api/callback", content=body, headers=headers)
+
+    assert response.status_code == 200, response.text
+
+
+async def test_callback_is_verified_over_the_raw_body(callback_client):
+    # not what the parsed model would serialize back to, only the raw bytes carry the signature
+    body = json.dumps(json.loads(fake_rtnet.paid_callback(1, {"externalId": "deposit-1", "amount": 1000})[0]), indent=2)
+
+    response = await callback_client.post("/api/callback", content=body, headers=fake_rtnet.callback_headers(body))
+
+    assert response.status_code == 200, response.text
+
+
+async def test_tampered_callback_is_rejected(callback_client):
+    body, headers = fake_rtnet.paid_callback(1, {"externalId": "deposit-1", "amount": 1000})
+    tampered = body.replace('"Amount": 1000', '"Amount": 100000')
+    assert tampered != body
+
+    response = await callback_client.post("/api/callback", content=tampered, headers=headers)
+
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Invalid signature"}
@@ -0,0 +1,48 @@
+import asyncio
+import random
+
+import pytest
+
+from core import redis
+from utils.subscriptions import SubscriptionCache
+
+pytestmark = pytest.mark.anyio
+
+CHAT_ID = -100123
+
+
+@pytest.fixture
+async def subscriptions(telegram, redis_server):
+    user_id = random.randrange(10 ** 12, 2 * 10 ** 12)
+    cache = SubscriptionCache(positive_ttl=60, negative_ttl=5, concurrency=2)
+
+    yield cache, user_id
+
+    await redis.delete(cache.key(user_id, CHAT_ID))
+
+
+async def test_telegram_error_is_not_subscribed_and_cached(subscriptions, telegram):
+    cache, user_id = subscriptions
+    telegram["failures"]["getchatmember"] = 1
+
+    assert not await cache.check(user_id, CHAT_ID)
+    assert not await cache.check(user_id, CHAT_ID)
+
+    assert telegram["calls"]["getchatmember"] == 1
+    assert 0 < await redis.ttl(cache.key(user_id, CHAT_ID)) <= 5
+
+
+async def test_cancelled_caller_does_not_cancel_other_waiters(subscriptions, telegram):
+    cache, user_id = subscriptions
+    telegram["delays"]["getchatmember"] = 0.2
+
+    first = asyncio.create_task(cache.check(user_id, CHAT_ID))
+    second = asyncio.create_task(cache.check(user_id, CHAT_ID))
+    # both are waiting on the same Telegram call
+    while telegram["calls"]["getchatmember"] == 0:
+        await asyncio.sleep(0.001)
+    first.cancel()
+
+    assert await second
+    assert first.cancelled()
+    assert telegram["calls"]["getchatmember"] == 1
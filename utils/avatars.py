@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from core import get_user_profile_photo, redis, settings, UserAvatar
+
+
+class AvatarQueue:
+    """
+    Background copy of Telegram avatars to S3, off the signup path.
+    A user id is queued at most once at a time, failed jobs are retried with exponential backoff.
+    """
+
+    def __init__(self, workers: int, max_attempts: int, retry_backoff: float, recheck_interval: int):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.recheck_interval = recheck_interval
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._queued: set[int] = set()
+
+    def enqueue(self, user_id: int) -> bool:
+        if user_id in self._queued:
+            return False
+
+        self._queued.add(user_id)
+        self._queue.put_nowait(user_id)
+        return True
+
+    async def enqueue_missing(self, user_id: int) -> bool:
+        """
+        Queues a user who still has no avatar, their job may have been lost in a restart or run out of attempts.
+        At most once per `recheck_interval` across processes, many users have no Telegram photo at all.
+        """
+        if user_id in self._queued:
+            return False
+
+        if not await redis.set(f"avatar:recheck:{user_id}", 1, nx=True, ex=self.recheck_interval):
+            return False
+
+        return self.enqueue(user_id)
+
+    async def join(self) -> None:
+        """Waits until every queued user is processed."""
+        await self._queue.join()
+
+    async def run(self, on_avatar: Callable[[int, UserAvatar], Awaitable[None]]):
+        await asyncio.gather(*[self._worker(on_avatar) for _ in range(self.workers)])
+
+    async def _worker(self, on_avatar: Callable[[int, UserAvatar], Awaitable[None]]):
+        while True:
+            user_id = await self._queue.get()
+            try:
+                await self.process(user_id, on_avatar)
+            finally:
+                self._queued.discard(user_id)
+                self._queue.task_done()
+
+    async def process(self, user_id: int, on_avatar: Callable[[int, UserAvatar], Awaitable[None]]) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                avatar = await get_user_profile_photo(user_id)
+                if avatar is not None:
+                    await on_avatar(user_id, avatar)
+                return
+            except Exception as e:
+                logging.exception("can't get user photo, attempt %s", attempt, exc_info=e)
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+
+
+avatar_queue = AvatarQueue(
+    workers=settings.AVATAR_WORKERS,
+    max_attempts=settings.AVATAR_MAX_ATTEMPTS,
+    retry_backoff=settings.AVATAR_RETRY_BACKOFF,
+    recheck_interval=settings.AVATAR_RECHECK_INTERVAL,
+)
@@ -0,0 +1,127 @@
+"""
+RTnet signing throughput and event loop lag: `python -m utils.bench_rtnet_crypto [operations] [max workers]`.
+Prints P-521/SHA-512 signs and verifies per second inline and with 1, 2, 4... pool workers,
+then the delay of a 10ms ticker while the same signs run on the loop and in the crypto pool.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ecdsa import NIST521p
+from ecdsa.keys import SigningKey
+
+from utils.rtnet_crypto import sign, verify
+
+TICK = 0.01
+
+
+def sample_keys() -> tuple[str, str]:
+    key = SigningKey.generate(curve=NIST521p, hashfunc=hashlib.sha512)
+    return base64.b64encode(key.to_der()).decode(), base64.b64encode(key.get_verifying_key().to_der()).decode()
+
+
+def sample_body(i: int) -> bytes:
+    body = {
+        "clientId": i,
+        "externalId": f"bench-{i}",
+        "paymentMethod": "Sber",
+        "amount": 1000,
+        "projectId": "bench",
+    }
+    return str.encode(json.dumps(body).lower())
+
+
+def bench_inline(private_key: str, public_key: str, operations: int) -> tuple[float, float]:
+    bodies = [sample_body(i) for i in range(operations)]
+
+    started = time.perf_counter()
+    signatures = [sign(private_key, body) for body in bodies]
+    signs = operations / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    assert all(verify(public_key, body, signature) for body, signature in zip(bodies, signatures))
+    return signs, operations / (time.perf_counter() - started)
+
+
+def bench_pool(private_key: str, public_key: str, operations: int, workers: int) -> tuple[float, float]:
+    bodies = [sample_body(i) for i in range(operations)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # warm up the workers, the first call of each pays for parsing the keys
+        list(pool.map(sign, [private_key] * workers, bodies[:workers]))
+        list(pool.map(verify, [public_key] * workers, bodies[:workers], ["00"] * workers))
+
+        started = time.perf_counter()
+        signatures = list(pool.map(sign, [private_key] * operations, bodies, chunksize=8))
+        signs = operations / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        assert all(pool.map(verify, [public_key] * operations, bodies, signatures, chunksize=8))
+        return signs, operations / (time.perf_counter() - started)
+
+
+async def ticker(delays: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        delays.append(time.perf_counter() - started - TICK)
+
+
+async def loop_lag(private_key: str, operations: int, pool: ProcessPoolExecutor | None) -> list[float]:
+    """Delays of a 10ms ticker while `operations` concurrent requests are signed, inline if there is no pool."""
+    loop = asyncio.get_running_loop()
+
+    async def sign_request(i: int) -> str:
+        await asyncio.sleep(0)
+        if pool is None:
+            return sign(private_key, sample_body(i))
+        return await loop.run_in_executor(pool, sign, private_key, sample_body(i))
+
+    delays: list[float] = []
+    stop = asyncio.Event()
+    task = asyncio.create_task(ticker(delays, stop))
+    await asyncio.gather(*[sign_request(i) for i in range(operations)])
+    stop.set()
+    await task
+    return delays
+
+
+def print_lag(name: str, delays: list[float]) -> None:
+    print(
+        f"loop lag, {name}: max {max(delays) * 1000:.1f}ms, "
+        f"mean {statistics.fmean(delays) * 1000:.1f}ms over {len(delays)} ticks"
+    )
+
+
+async def bench_lag(private_key: str, operations: int, workers: int) -> None:
+    print_lag("inline", await loop_lag(private_key, operations, None))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(sign, [private_key] * workers, [b""] * workers))
+        print_lag(f"{workers} workers", await loop_lag(private_key, operations, pool))
+
+
+if __name__ == "__main__":
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    private_key, public_key = sample_keys()
+
+    signs, verifies = bench_inline(private_key, public_key, operations)
+    print(f"inline: {signs:.0f} signs/s, {verifies:.0f} verifies/s")
+
+    workers = 1
+    while workers <= max_workers:
+        signs, verifies = bench_pool(private_key, public_key, operations, workers)
+        print(
+            f"{workers} workers: {signs:.0f} signs/s, {verifies:.0f} verifies/s, "
+            f"{signs / workers:.0f} signs per core"
+        )
+        workers *= 2
+
+    asyncio.run(bench_lag(private_key, operations, max_workers))
@@ -0,0 +1,49 @@
+"""
+Thumbnail throughput per core: `python -m utils.bench_thumbnails [images] [max workers]`.
+Renders the same Telegram sized avatar with 1, 2, 4... pool workers and prints thumbnails per second.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+from core import settings
+from core._images import render_thumbnail
+
+
+def sample_avatar(size: int = 640) -> bytes:
+    buffer = BytesIO()
+    Image.effect_mandelbrot((size, size), (-2.0, -1.5, 1.0, 1.5), 100).convert("RGB").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def bench(data: bytes, images: int, workers: int) -> float:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # warm up the workers, the first call pays for the import of PIL
+        list(pool.map(render_thumbnail, [data] * workers, *render_args(workers)))
+
+        started = time.perf_counter()
+        list(pool.map(render_thumbnail, [data] * images, *render_args(images), chunksize=8))
+        return images / (time.perf_counter() - started)
+
+
+def render_args(count: int) -> tuple[list, list, list]:
+    return [settings.THUMBNAIL_SIZE] * count, [settings.THUMBNAIL_FORMAT] * count, [settings.THUMBNAIL_QUALITY] * count
+
+
+if __name__ == "__main__":
+    images = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    data = sample_avatar()
+
+    workers = 1
+    while workers <= max_workers:
+        per_second = bench(data, images, workers)
+        print(
+            f"{settings.THUMBNAIL_FORMAT} {settings.THUMBNAIL_SIZE}px, {workers} workers: "
+            f"{per_second:.0f} thumbnails/s, {per_second / workers:.0f} per core"
+        )
+        workers *= 2
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime
+
+from redis.exceptions import ResponseError
+from sqlalchemy.exc import DataError, IntegrityError
+
+from core import redis, settings, get_pending_bets
+from db.repository import GameRepository
+
+BETS_STREAM = "bets:stream"
+BETS_GROUP = "bets"
+# entries that can't be written on their own, kept with the error for a manual refund
+BETS_DEAD_STREAM = "bets:dead"
+
+
+async def task_bet_queue_consumer():
+    try:
+        await redis.xgroup_create(BETS_STREAM, BETS_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+    consumer = f"{socket.gethostname()}:{os.getpid()}"
+
+    # bets read but not acknowledged by a consumer that died are claimed and flushed first
+    start_id = "0-0"
+    while True:
+        start_id, *_ = await redis.xautoclaim(
+            BETS_STREAM, BETS_GROUP, consumer, min_idle_time=60_000, start_id=start_id,
+        )
+        if start_id == "0-0":
+            break
+
+    last_id = "0"
+    while True:
+        try:
+            flushed = await flush_bets(consumer, last_id)
+            if last_id == "0" and not flushed:
+                last_id = ">"
+        except Exception as e:
+            logging.exception("task bet queue consumer exception", exc_info=e)
+            # the failed batch stays in the pending list of this consumer, it is read again first
+            last_id = "0"
+            await asyncio.sleep(1)
+
+
+async def flush_bets(consumer: str, last_id: str = ">") -> int:
+    """
+    Reads up to BET_QUEUE_BATCH_SIZE bets or whatever arrives within BET_QUEUE_FLUSH_INTERVAL
+    and writes them with one multi-row insert. Delivery is at-least-once: the entries are
+    acknowledged only after the insert is committed, a replayed entry is skipped by its `stream_id`.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.BET_QUEUE_FLUSH_INTERVAL
+
+    entries: list[tuple[str, dict[str, str]]] = []
+    while len(entries) < settings.BET_QUEUE_BATCH_SIZE:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+
+        response = await redis.xreadgroup(
+            BETS_GROUP,
+            consumer,
+            {BETS_STREAM: last_id},
+            count=settings.BET_QUEUE_BATCH_SIZE - len(entries),
+            block=max(int(remaining * 1000), 1),
+        )
+        if not response or not response[0][1]:
+            if last_id != ">":
+                break
+            continue
+
+        entries.extend(response[0][1])
+        if last_id != ">":
+            last_id = entries[-1][0]
+
+    if not entries:
+        return 0
+
+    dead = await write_bets(entries)
+
+    flushed_by_game: dict[str, int] = {}
+    for _, fields in entries:
+        if "game_id" in fields:
+            flushed_by_game[fields["game_id"]] = flushed_by_game.get(fields["game_id"], 0) + 1
+
+    async with redis.pipeline(transaction=True) as pipe:
+        for entry_id, fields, error in dead:
+            pipe.xadd(BETS_DEAD_STREAM, {**fields, "entry_id": entry_id, "error": error})
+        pipe.xack(BETS_STREAM, BETS_GROUP, *[entry_id for entry_id, _ in entries])
+        pipe.xdel(BETS_STREAM, *[entry_id for entry_id, _ in entries])
+        for game_id, count in flushed_by_game.items():
+            pipe.decrby(f"game:{game_id}:bets_pending", count)
+        await pipe.execute()
+
+    return len(entries)
+
+
+async def write_bets(entries: list[tuple[str, dict[str, str]]]) -> list[tuple[str, dict[str, str], str]]:
+    """
+    Inserts the bets with one multi-row insert. If it is refused, e.g. by a foreign key, the bets are
+    inserted one by one and those refused on their own are returned as (entry id, fields, error) to be
+    dead-lettered, so one bad entry doesn't block the stream. Other errors are raised and the batch retried.
+    """
+    bets: list[dict] = []
+    dead: list[tuple[str, dict[str, str], str]] = []
+    for entry_id, fields in entries:
+        try:
+            bets.append(entry_to_bet(entry_id, fields))
+        except (KeyError, ValueError) as e:
+            dead.append((entry_id, fields, repr(e)))
+
+    if not bets:
+        return dead
+
+    try:
+        await GameRepository.insert_bets(bets)
+        return dead
+    except (IntegrityError, DataError) as e:
+        logging.warning(f"bets batch of {len(bets)} is refused, inserting one by one: {e!r}")
+
+    fields_by_id = dict(entries)
+    for bet in bets:
+        try:
+            await GameRepository.insert_bets([bet])
+        except (IntegrityError, DataError) as e:
+            logging.error(f"bet {bet['stream_id']} is refused, moved to {BETS_DEAD_STREAM}: {e!r}")
+            dead.append((bet["stream_id"], fields_by_id[bet["stream_id"]], repr(e)))
+
+    return dead
+
+
+def entry_to_bet(entry_id: str, fields: dict[str, str]) -> dict:
+    return {
+        "stream_id": entry_id,
+        "user_id": int(fields["user_id"]),
+        "game_id": int(fields["game_id"]),
+        "total_rate": float(fields["total_rate"]),
+        "currency": fields["currency"],
+        "choose": fields["choose"],
+        "time_created": datetime.fromisoformat(fields["time_created"]),
+    }
+
+
+async def wait_bets_drained(game_id: int) -> None:
+    """Blocks the settlement of the game until every queued bet of it is written to the database."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.BET_QUEUE_DRAIN_TIMEOUT
+
+    while (pending := await get_pending_bets(game_id)) > 0:
+        if loop.time() > deadline:
+            raise TimeoutError(f"{pending} queued bets of game {game_id} are not written yet")
+
+        await asyncio.sleep(settings.BET_QUEUE_FLUSH_INTERVAL)
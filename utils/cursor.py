@@ -0,0 +1,17 @@
+import base64
+from datetime import datetime
+
+from fastapi import HTTPException
+
+
+def encode_cursor(date: datetime, row_id: int) -> str:
+    """Opaque keyset cursor of a `(date, id)` position, safe to pass in a query string."""
+    return base64.urlsafe_b64encode(f"{date.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        date, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(date), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,129 @@
+"""
+Local stand-in for the RTnet merchant API, enough for deposits and withdrawals to run offline.
+Start it with `python -m utils.fake_rtnet` and set RTNET_BASE_URL=http://localhost:8082,
+`python -m utils.fake_rtnet keys` prints a private key to use for RTNET_RUB_PRIVATE_KEY and RTNET_UZS_PRIVATE_KEY.
+With FAKE_RTNET_CALLBACK_URL set every invoice is reported paid to it a second later, signed with a key
+generated at start, set RTNET_PUBLIC_KEY to the public key it prints.
+"""
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import os
+import sys
+from datetime import datetime, UTC, timedelta
+
+import aiohttp
+from aiohttp import web
+from ecdsa import NIST521p
+from ecdsa.keys import SigningKey
+
+USDT_PRICE = 98.0
+
+ids = itertools.count(1)
+callback_key = SigningKey.generate(curve=NIST521p)
+
+
+def generate_private_key() -> str:
+    return base64.b64encode(SigningKey.generate(curve=NIST521p).to_der()).decode()
+
+
+@web.middleware
+async def require_signature(request: web.Request, handler):
+    # "<signature hex>:<api id>", the signature itself can't be checked without the merchant's public key
+    signature, _, api_id = request.headers.get("ECDSA", "").partition(":")
+    try:
+        bytes.fromhex(signature)
+    except ValueError:
+        signature = ""
+
+    if not signature or not api_id:
+        return web.json_response({"message": "Invalid signature"}, status=401)
+
+    # kept for tests, they check the signature against the exact body sent
+    request.app["requests"].append((request.path, await request.read(), signature, api_id))
+    request.app["connections"].add(id(request.transport))
+    return await handler(request)
+
+
+async def create_withdrawal(request: web.Request) -> web.Response:
+    body = await request.json()
+    return web.json_response({
+        "id": next(ids),
+        "externalId": body["externalId"],
+        "amount": body["amount"],
+        "status": "Created",
+    })
+
+
+def paid_callback(invoice_id: int, body: dict) -> tuple[str, dict[str, str]]:
+    """Body and headers of the callback reporting the invoice paid, signed with `callback_key`."""
+    callback_body = json.dumps({
+        "EntityType": "Invoice",
+        "Id": str(invoice_id),
+        "ExternalId": body["externalId"],
+        "Status": "Paid",
+        "Currency": "RUB",
+        "Amount": body["amount"],
+        "PaidAmount": body["amount"],
+        "UsdtPrice": USDT_PRICE,
+    })
+    return callback_body, callback_headers(callback_body)
+
+
+def callback_headers(callback_body: str) -> dict[str, str]:
+    signature = callback_key.sign(callback_body.lower().encode(), hashfunc=hashlib.sha512).hex()
+    return {"Content-Type": "application/json", "Authorization1": f"ECDSA {signature}"}
+
+
+async def send_paid_callback(url: str, invoice_id: int, body: dict) -> None:
+    await asyncio.sleep(1)
+    callback_body, headers = paid_callback(invoice_id, body)
+
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, data=callback_body, headers=headers) as r:
+            print(f"callback of invoice {invoice_id}: {r.status}")
+
+
+async def create_invoice(request: web.Request) -> web.Response:
+    body = await request.json()
+    invoice_id = next(ids)
+
+    callback_url = os.environ.get("FAKE_RTNET_CALLBACK_URL")
+    if callback_url:
+        # referenced until done, the loop keeps only weak references to tasks
+        task = asyncio.create_task(send_paid_callback(callback_url, invoice_id, body))
+        request.app["callbacks"].add(task)
+        task.add_done_callback(request.app["callbacks"].discard)
+
+    return web.json_response({
+        "id": invoice_id,
+        "externalId": body["externalId"],
+        "amount": body["amount"],
+        "usdtPrice": USDT_PRICE,
+        "usdtAmount": round(body["amount"] / USDT_PRICE, 2),
+        "expiryDate": (datetime.now(UTC) + timedelta(minutes=15)).isoformat(),
+        "cardNumber": "2200000000000000",
+        "cardHolder": "TEST TEST",
+        "bank": "Test Bank",
+        "paymentMethod": body["paymentMethod"],
+    })
+
+
+def create_app() -> web.Application:
+    app = web.Application(middlewares=[require_signature])
+    app["callbacks"] = set()
+    app["requests"] = []
+    app["connections"] = set()
+    app.router.add_post("/api/merchant/Withdrawal/Create", create_withdrawal)
+    app.router.add_post("/api/merchant/Invoice/Create", create_invoice)
+    return app
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["keys"]:
+        print(generate_private_key())
+    else:
+        print("RTNET_PUBLIC_KEY=" + base64.b64encode(callback_key.get_verifying_key().to_der()).decode())
+        web.run_app(create_app(), port=8082)
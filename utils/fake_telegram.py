@@ -0,0 +1,76 @@
+"""
+Local stand-in for the Telegram Bot API, enough for the avatar and subscription flows to run offline.
+Start it with `python -m utils.fake_telegram` and set TG_API_SERVER=http://localhost:8081,
+the local MinIO from docker-compose plays S3.
+"""
+import asyncio
+import hashlib
+from collections import Counter
+from io import BytesIO
+
+from aiohttp import web
+from PIL import Image
+
+
+def avatar_image(user_id: int, size: int = 640) -> bytes:
+    color = tuple(hashlib.sha256(str(user_id).encode()).digest()[:3])
+    buffer = BytesIO()
+    Image.new("RGB", (size, size), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+async def api_method(request: web.Request) -> web.Response:
+    method = request.match_info["method"].lower()
+    data = dict(request.query) | dict(await request.post())
+
+    request.app["calls"][method] += 1
+    if request.app["delays"].get(method):
+        await asyncio.sleep(request.app["delays"][method])
+    if request.app["failures"].get(method):
+        request.app["failures"][method] -= 1
+        return web.json_response({"ok": False, "error_code": 500, "description": "Internal Server Error"}, status=500)
+
+    if method == "getuserprofilephotos":
+        user_id = int(data["user_id"])
+        # users with an even id have no avatar
+        photos = [] if user_id % 2 == 0 else [[{
+            "file_id": f"avatar-{user_id}",
+            "file_unique_id": f"avatar-{user_id}",
+            "width": 640,
+            "height": 640,
+        }]]
+        result = {"total_count": len(photos), "photos": photos}
+    elif method == "getfile":
+        file_id = data["file_id"]
+        result = {"file_id": file_id, "file_unique_id": file_id, "file_path": f"photos/{file_id}.jpg"}
+    elif method == "getchatmember":
+        result = {"status": "member", "user": {"id": int(data["user_id"]), "is_bot": False, "first_name": "Test"}}
+    elif method == "createinvoicelink":
+        result = "https://t.me/$fake-invoice"
+    else:
+        return web.json_response({"ok": False, "error_code": 404, "description": "Not Found"}, status=404)
+
+    return web.json_response({"ok": True, "result": result})
+
+
+async def file(request: web.Request) -> web.Response:
+    file_id = request.match_info["path"].split("/")[-1].split(".")[0]
+    return web.Response(body=avatar_image(int(file_id.split("-")[-1])), content_type="image/jpeg")
+
+
+def create_app(failures: dict[str, int] | None = None) -> web.Application:
+    """
+    `failures` is how many times each (lowercase) method answers 500 before it works, `app["delays"]`
+    the seconds each one takes and `app["calls"]` counts the calls.
+    """
+    app = web.Application()
+    app["failures"] = failures if failures is not None else {}
+    app["delays"] = {}
+    app["calls"] = Counter()
+    app.router.add_route("*", "/bot{token}/{method}", api_method)
+    app.router.add_get("/file/bot{token}/{path:.+}", file)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), port=8081)
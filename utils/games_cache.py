@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from core import redis, settings
+
+T = TypeVar("T")
+
+GAMES_CHANGED_CHANNEL = "games:changed"
+
+
+class EventCache(Generic[T]):
+    """
+    Per-worker single value cache. Dropped on `invalidate()`, which the games pub/sub listener calls,
+    and after `ttl` seconds or the moment the loader returns, whichever comes first, as a safety net.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._value: T | None = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._expires_at = 0.0
+
+    async def get_or_load(self, loader: Callable[[], Awaitable[tuple[T, float | None]]]) -> T:
+        """`loader` returns the value and an optional unix time it stops being valid at."""
+        if time.time() < self._expires_at:
+            return self._value
+
+        async with self._lock:
+            if time.time() < self._expires_at:
+                return self._value
+
+            generation = self._generation
+            value, valid_until = await loader()
+
+            # an invalidation that arrived during the load may be about the loaded rows
+            if generation == self._generation:
+                self._value = value
+                self._expires_at = min(time.time() + self.ttl, valid_until or float("inf"))
+
+            return value
+
+
+games_cache: EventCache = EventCache(ttl=settings.GAMES_CACHE_TTL)
+
+
+async def publish_games_changed() -> None:
+    await redis.publish(GAMES_CHANGED_CHANNEL, 1)
+
+
+async def task_games_cache_listener():
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(GAMES_CHANGED_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] in {"subscribe", "message"}:
+                        games_cache.invalidate()
+        except Exception as e:
+            logging.exception("task games cache listener exception", exc_info=e)
+            games_cache.invalidate()
+            await asyncio.sleep(1)
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+
+from core import redis
+
+
+async def migrate_task_keys(batch_size: int = 1000) -> None:
+    """
+    Moves the legacy `user:{id}:task:{task_id}:complete` keys into the per-user `user:{id}:tasks` hashes
+    and logs the memory both layouts take, as reported by MEMORY USAGE.
+    """
+    users: set[str] = set()
+    migrated_keys = 0
+    memory_before = 0
+    memory_after = 0
+
+    keys: list[str] = []
+    async for key in redis.scan_iter(match="user:*:task:*:complete", count=batch_size):
+        keys.append(key)
+        if len(keys) >= batch_size:
+            memory_before += await migrate_keys_batch(keys, users)
+            migrated_keys += len(keys)
+            keys = []
+
+    if keys:
+        memory_before += await migrate_keys_batch(keys, users)
+        migrated_keys += len(keys)
+
+    users_list = list(users)
+    for i in range(0, len(users_list), batch_size):
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in users_list[i:i + batch_size]:
+                pipe.memory_usage(f"user:{user_id}:tasks")
+            memory_after += sum(usage or 0 for usage in await pipe.execute())
+
+    logging.info(
+        "migrate_task_keys success: %s keys of %s users, %s bytes per user before, %s bytes per user after",
+        migrated_keys,
+        len(users),
+        memory_before // max(len(users), 1),
+        memory_after // max(len(users), 1),
+    )
+
+
+async def migrate_keys_batch(keys: list[str], users: set[str]) -> int:
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.memory_usage(key)
+        memory = sum(usage or 0 for usage in await pipe.execute())
+
+    async with redis.pipeline(transaction=True) as pipe:
+        for key in keys:
+            _, user_id, _, task_id, _ = key.split(":")
+            users.add(user_id)
+            pipe.hset(f"user:{user_id}:tasks", task_id, 1)
+        pipe.delete(*keys)
+        await pipe.execute()
+
+    return memory
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(migrate_task_keys())
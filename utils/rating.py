@@ -0,0 +1,50 @@
+import asyncio
+import logging
+import sys
+import uuid
+
+from core import set_users_rating, add_users_rating, replace_rating, redis
+from core._constants import HOURS_IN_SECONDS
+from db.database import transaction
+from db.repository import GameRepository
+
+
+async def repair_users_rating(user_ids: list[int], batch_size: int = 1000) -> None:
+    """
+    Recomputes the rating of the given users from their full bet history and overwrites it in the `rating` zset.
+    The leaderboard is otherwise maintained incrementally at settlement, so this is only a repair job.
+    """
+    for i in range(0, len(user_ids), batch_size):
+        await set_users_rating(await GameRepository.get_users_rating(user_ids[i:i + batch_size]))
+
+    logging.info("repair_users_rating success for %s users", len(user_ids))
+
+
+@transaction()
+async def rebuild_rating(batch_size: int = 5000) -> None:
+    """
+    Rebuilds the whole `rating` zset from the bet history in a temporary key renamed over it at the end,
+    readers see the old board until then. Run it between settlements, increments made meanwhile are lost.
+    """
+    key = f"rating:rebuild:{uuid.uuid4()}"
+    users = 0
+
+    async for rating in GameRepository.stream_all_users_rating(batch_size):
+        await add_users_rating(key, rating, ttl=HOURS_IN_SECONDS)
+        users += len(rating)
+
+    if users:
+        await replace_rating(key)
+    else:
+        await redis.delete("rating")
+
+    logging.info("rebuild_rating success for %s users", users)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # `python -m utils.rating rebuild` or `python -m utils.rating <user id> ...`
+    if sys.argv[1:] == ["rebuild"]:
+        asyncio.run(rebuild_rating())
+    else:
+        asyncio.run(repair_users_rating([int(user_id) for user_id in sys.argv[1:]]))
@@ -1,5 +1,12 @@
 import math
 
+from sqlalchemy import func
+from sqlalchemy.sql import ColumnElement
+
 
 def round_down(n: float) -> float:
     return math.floor(n * 100) / 100.0
+
+
+def sql_round_down(expr: ColumnElement[float]) -> ColumnElement[float]:
+    return func.floor(expr * 100) / 100.0
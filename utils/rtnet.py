@@ -1,13 +1,15 @@
-import base64
-import hashlib
 import json
+from typing import Literal
 
 import aiohttp
-from ecdsa.keys import VerifyingKey, SigningKey
 from fastapi import HTTPException
 
+from core import settings
 from db.database import transaction
 from endpoint.models import CreatedInvoiceDto
+from utils.rtnet_crypto import sign_in_pool, verify_in_pool
+
+RtnetProjectLiteral = Literal["RUB", "UZS"]
 
 
 # # VERIFY
@@ -46,7 +48,7 @@ from endpoint.models import CreatedInvoiceDto
 # print("API Response: " + response.text)
 
 class RtnetAPI:
-    PUBLIC_KEY = "MIGbMBAGByqGSM49AgEGBSuBBAAjA4GGAAQBU+2j5U/5R1J9IVuEO1x3yPxeEtBXblH9yjepfGWsfPBcQWqjeRPpxGtFcmqMSZKhFGPcWY5uwc3lLIGiRTrKc4oBqK3UXMU+uiJ2LOt4ukmX/uBZmebBWxhO92hNiDxgpmyUmLr6hKKR/Su6pKaWEXzLrRAkkVPxf/PhpGR+havSR1s="
+    PUBLIC_KEY = settings.RTNET_PUBLIC_KEY
 
     def __init__(
             self,
@@ -57,22 +59,44 @@ class RtnetAPI:
     ):
         self.project_id = project_id
         self.api_id = api_id
-        self.private_key = SigningKey.from_der(base64.b64decode(private_key_base64))
-        self.session = aiohttp.ClientSession(base_url=base_url)
+        # parsed by the crypto pool workers, once per worker
+        self.private_key_base64 = private_key_base64
+        self.base_url = base_url
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Created on first use, it has to be made inside the running event loop."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                base_url=self.base_url,
+                connector=aiohttp.TCPConnector(
+                    limit=settings.RTNET_POOL_SIZE,
+                    limit_per_host=settings.RTNET_POOL_SIZE_PER_HOST,
+                    keepalive_timeout=settings.RTNET_KEEPALIVE_TIMEOUT,
+                    ttl_dns_cache=300,
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=settings.RTNET_TIMEOUT,
+                    sock_connect=settings.RTNET_CONNECT_TIMEOUT,
+                ),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
     @staticmethod
-    def validate(request_body: str, sign: str) -> bool:
-        verifying_key = VerifyingKey.from_der(base64.b64decode(RtnetAPI.PUBLIC_KEY))
+    async def validate(request_body: str, sign: str) -> bool:
+        """Checks the ECDSA signature of a callback body in the crypto pool, off the event loop."""
         normalized_callback_body = str.encode(request_body.lower())
-        signature_bytes = bytes.fromhex(sign)
-        verify_result = verifying_key.verify(signature_bytes, normalized_callback_body, hashfunc=hashlib.sha512)
-        print("Signature valid: " + str(verify_result))
-        return verify_result
+        return await verify_in_pool(RtnetAPI.PUBLIC_KEY, normalized_callback_body, sign)
 
-    def sign(self, request_body: str) -> str:
+    async def sign(self, request_body: str) -> str:
         signing_data = str.encode((request_body + self.api_id).lower())
-        signature = self.private_key.sign(signing_data, hashfunc=hashlib.sha512)
-        signature_hex = signature.hex()
+        signature_hex = await sign_in_pool(self.private_key_base64, signing_data)
         auth_header_value = signature_hex + ":" + self.api_id
 
         return auth_header_value
@@ -103,10 +127,11 @@ class RtnetAPI:
             "extIP": ext_ip,
             "projectId": self.project_id,
         }
-        sign = self.sign(json.dumps(body))
+        request_body = json.dumps(body)
+        sign = await self.sign(request_body)
         async with self.session.post(
                 "/api/merchant/Withdrawal/Create",
-                json=body,
+                data=request_body,
                 headers=self.headers(sign),
                 ssl=False,
         ) as r:
@@ -129,10 +154,11 @@ class RtnetAPI:
             "amount": amount,
             "projectId": self.project_id,
         }
-        sign = self.sign(json.dumps(body))
+        request_body = json.dumps(body)
+        sign = await self.sign(request_body)
         async with self.session.post(
                 "/api/merchant/Invoice/Create",
-                json=body,
+                data=request_body,
                 headers=self.headers(sign),
                 ssl=False,
         ) as r:
@@ -140,3 +166,28 @@ class RtnetAPI:
                 raise HTTPException(detail=f"failed to create deposit {await r.text()}", status_code=400)
             response = CreatedInvoiceDto.model_validate(await r.json())
         return response
+
+
+class RtnetRegistry:
+    """One long-lived client per RTnet project, keys are parsed and connection pools opened once per process."""
+
+    def __init__(self):
+        self._clients: dict[RtnetProjectLiteral, RtnetAPI] = {}
+
+    def get(self, currency: RtnetProjectLiteral) -> RtnetAPI:
+        client = self._clients.get(currency)
+        if client is None:
+            client = self._clients[currency] = RtnetAPI(
+                getattr(settings, f"RTNET_{currency}_PROJECT_ID"),
+                getattr(settings, f"RTNET_{currency}_API_ID"),
+                getattr(settings, f"RTNET_{currency}_PRIVATE_KEY"),
+                settings.RTNET_BASE_URL,
+            )
+        return client
+
+    async def close(self) -> None:
+        for client in self._clients.values():
+            await client.close()
+
+
+rtnet_clients = RtnetRegistry()
@@ -0,0 +1,60 @@
+import asyncio
+import base64
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from ecdsa import BadSignatureError
+from ecdsa.keys import SigningKey, VerifyingKey
+
+from core import settings
+
+_pool: ProcessPoolExecutor | None = None
+
+
+@lru_cache
+def signing_key(private_key_base64: str) -> SigningKey:
+    return SigningKey.from_der(base64.b64decode(private_key_base64))
+
+
+@lru_cache
+def verifying_key(public_key_base64: str) -> VerifyingKey:
+    return VerifyingKey.from_der(base64.b64decode(public_key_base64))
+
+
+def sign(private_key_base64: str, data: bytes) -> str:
+    """P-521/SHA-512 signature of `data` as hex, the key is parsed once per process."""
+    return signing_key(private_key_base64).sign(data, hashfunc=hashlib.sha512).hex()
+
+
+def verify(public_key_base64: str, data: bytes, signature_hex: str) -> bool:
+    try:
+        return verifying_key(public_key_base64).verify(bytes.fromhex(signature_hex), data, hashfunc=hashlib.sha512)
+    except (BadSignatureError, ValueError):
+        return False
+
+
+def get_crypto_pool() -> ProcessPoolExecutor:
+    global _pool
+
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.RTNET_CRYPTO_WORKERS)
+    return _pool
+
+
+async def sign_in_pool(private_key_base64: str, data: bytes) -> str:
+    return await asyncio.get_running_loop().run_in_executor(get_crypto_pool(), sign, private_key_base64, data)
+
+
+async def verify_in_pool(public_key_base64: str, data: bytes, signature_hex: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        get_crypto_pool(), verify, public_key_base64, data, signature_hex
+    )
+
+
+def shutdown_crypto_pool() -> None:
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
@@ -1,11 +1,14 @@
 import logging
+import math
 from datetime import datetime, UTC, timedelta
 
 import anyio
 
-from core import get_token_price, set_user_rating
-from db.database import transaction
+from core import get_pending_bets, get_token_price, incr_users_rating, set_game_results, settings
+from db.database import require_session, transaction
 from db.repository import GameRepository, UsersRepository
+from utils.bet_queue import wait_bets_drained
+from utils.games_cache import publish_games_changed
 from utils.round_down import round_down
 
 
@@ -18,13 +21,105 @@ async def scheduler_games_task():
             logging.exception("task scheduler games task exception", exc_info=e)
 
 
+async def scheduler_game_stats_task():
+    """
+    Rebuilds the live pool counters of the open game once they drift from SQL, e.g. when a bet
+    increments them between the SQL read and the rewrite of a reconcile. The same difference has to
+    be seen twice in a row, a bet committed but not yet counted is not drift.
+    """
+    last_drift = None
+    while True:
+        try:
+            drift = await find_game_stats_drift()
+            if drift is not None and drift == last_drift:
+                logging.warning(f"game {drift[0]} pool counters drifted from SQL, rebuilding")
+                await GameRepository.reconcile_stats_of_game(drift[0])
+                drift = None
+            last_drift = drift
+        except Exception as e:
+            logging.exception("task scheduler game stats task exception", exc_info=e)
+            last_drift = None
+
+        await anyio.sleep(settings.GAME_STATS_RECONCILE_INTERVAL)
+
+
 @transaction()
+async def find_game_stats_drift() -> tuple[int, dict] | None:
+    """The open game and its SQL stats if its Redis counters disagree with them."""
+    game = await GameRepository.get_next_game()
+    # queued bets are counted before they reach SQL
+    if game is None or await get_pending_bets(game.id):
+        return None
+
+    stats = await GameRepository.compute_stats_of_game(game.id)
+    counters = await GameRepository.get_stats_of_game(game.id)
+
+    for currency, choices in stats.items():
+        for choice, choice_stats in choices.items():
+            for stat, value in choice_stats.items():
+                if not math.isclose(value, counters[currency][choice][stat], abs_tol=1e-6):
+                    return game.id, stats
+
+    return None
+
+
 async def process_game_bet(game_id: int):
+    await wait_bets_drained(game_id)
+
+    if settings.SETTLEMENT_MODE == "orm":
+        rating_deltas = await process_game_bet_orm(game_id)
+    else:
+        rating_deltas = await process_game_bet_bulk(game_id)
+
+    # applied only once the settlement is committed, a failed round must not move the leaderboard
+    await incr_users_rating(rating_deltas)
+    # served by init as previous_game_results during the few seconds after the round
+    await set_game_results(game_id, await GameRepository.get_game_results(game_id), ttl=60)
+    await publish_games_changed()
+
+
+@transaction()
+async def process_game_bet_bulk(game_id: int) -> dict[int, float]:
+    game = await GameRepository.get_by_id(game_id)
+    if game is None:
+        return {}
+
+    token_price = await get_token_price()
+    if token_price is None:
+        return {}
+    token_price = round_down(token_price)
+
+    is_course_correct = token_price > round_down(game.course)
+    win_choice = "YES" if is_course_correct else "NO"
+
+    stats = await GameRepository.reconcile_stats_of_game(game.id)
+    ratios = {}
+    for currency, choices in stats.items():
+        total_pool = sum(choice_stats["total_rate"] for choice_stats in choices.values())
+        if currency == "USDT":
+            total_pool *= 0.97
+
+        choice_pool = choices[win_choice]["total_rate"]
+        ratios[currency] = (total_pool / choice_pool) if choice_pool else 1
+
+    bet_ids = await GameRepository.get_unsettled_bet_ids(game.id)
+    for i in range(0, len(bet_ids), settings.SETTLEMENT_BATCH_SIZE):
+        batch = bet_ids[i:i + settings.SETTLEMENT_BATCH_SIZE]
+        await GameRepository.settle_bets_bulk(game.id, win_choice, ratios, batch[0], batch[-1])
+
+    game.is_computed = True
+
+    return await GameRepository.get_rating_deltas(game.id)
+
+
+@transaction()
+async def process_game_bet_orm(game_id: int) -> dict[int, float]:
     game = await GameRepository.get_or_raise_by_id(game_id)
 
-    token_price = round_down(await get_token_price())
+    token_price = await get_token_price()
     if token_price is None:
-        return
+        return {}
+    token_price = round_down(token_price)
 
     is_course_correct = token_price > round_down(game.course)
 
@@ -37,6 +132,8 @@ async def process_game_bet(game_id: int):
         game.id, "WORDS", "YES" if is_course_correct else "NO"
     )
 
+    # credited all at once after the loop, see `UsersRepository.credit_referrals`
+    referral_credits: list[dict] = []
     for bet in game.users_games:
         user = await UsersRepository.get_by_id(bet.user_id)
         if user is None:
@@ -55,30 +152,30 @@ async def process_game_bet(game_id: int):
         if correct_choice:
             if bet.currency == "USDT":
                 user.balance_usdt += bet.total_rate * ratio
-                await set_user_rating(user.id, await GameRepository.get_user_rating(user.id))
             else:
                 user.balance += bet.total_rate * ratio
 
             user.wins += 1
             bet.win_total_rate = round_down(bet.total_rate * ratio)
 
-            if user.ref_id:
-                ref_user = await UsersRepository.get_by_id(user.ref_id)
-                if bet.currency == "WORDS":
-                    referral_amount = round_down(bet.total_rate * 0.05)
-                    await UsersRepository.create_record_of_referral(
-                        user_id=user.id,
-                        ref_id=user.ref_id,
-                        user_game_id=bet.id,
-                        amount=referral_amount,
-                        currency=bet.currency,
-                    )
-                    ref_user.balance += referral_amount
+            if user.ref_id and bet.currency == "WORDS" and await UsersRepository.get_by_id(user.ref_id):
+                referral_credits.append({
+                    "user_id": user.id,
+                    "ref_id": user.ref_id,
+                    "user_game_id": bet.id,
+                    "amount": round_down(bet.total_rate * 0.05),
+                    "currency": bet.currency,
+                })
         else:
             bet.win_total_rate = -round_down(bet.total_rate * ratio)
 
+    await UsersRepository.credit_referrals(referral_credits)
     game.is_computed = True
 
+    # the session doesn't autoflush, the deltas are read back from the settled bets
+    await require_session().flush()
+    return await GameRepository.get_rating_deltas(game.id)
+
 
 async def wait_game():
     next_game = await GameRepository.game_to_compute()
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+
+from core import bot, redis, settings
+
+
+class SubscriptionCache:
+    """
+    Channel membership checks cached in Redis, `subscribe:{chat_id}:{user_id}` holds 1 or 0.
+    Members are kept for `positive_ttl`, non-members only for `negative_ttl` so a fresh subscription is seen soon.
+    Concurrent checks of the same (user, chat) in the process share one Telegram call.
+    Telegram errors count as not subscribed and are cached like it.
+    """
+
+    def __init__(self, positive_ttl: int, negative_ttl: int, concurrency: int):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.concurrency = concurrency
+        self._in_flight: dict[tuple[int, int | str], asyncio.Task[bool]] = {}
+
+    @staticmethod
+    def key(user_id: int, chat_id: int | str) -> str:
+        return f"subscribe:{chat_id}:{user_id}"
+
+    async def check(self, user_id: int, chat_id: int | str) -> bool:
+        cached = await redis.get(self.key(user_id, chat_id))
+        if cached is not None:
+            return cached == "1"
+
+        return await self._fetch_once(user_id, chat_id)
+
+    async def check_many(self, user_ids: list[int], chat_id: int | str) -> dict[int, bool]:
+        """Checks many users against one channel, at most `concurrency` Telegram calls at a time."""
+        if not user_ids:
+            return {}
+
+        cached = await redis.mget([self.key(user_id, chat_id) for user_id in user_ids])
+        result = {user_id: value == "1" for user_id, value in zip(user_ids, cached) if value is not None}
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(user_id: int) -> None:
+            async with semaphore:
+                result[user_id] = await self._fetch_once(user_id, chat_id)
+
+        await asyncio.gather(*[fetch(user_id) for user_id in set(user_ids) - result.keys()])
+        return result
+
+    async def _fetch_once(self, user_id: int, chat_id: int | str) -> bool:
+        key = (user_id, chat_id)
+        task = self._in_flight.get(key)
+        if task is None:
+            # a task of its own, a caller cancelled while waiting doesn't cancel it for the others
+            task = self._in_flight[key] = asyncio.create_task(self._fetch(user_id, chat_id))
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    async def _fetch(self, user_id: int, chat_id: int | str) -> bool:
+        try:
+            data = await bot.get_chat_member(chat_id, user_id)
+            subscribed = data.status not in {"left", "kicked"}
+        except Exception as e:
+            # fails closed, a bot without rights in the channel must not hand out the reward to everybody;
+            # cached as a non-member so an outage isn't retried on every check
+            logging.exception("check subscribe user exception", exc_info=e)
+            subscribed = False
+
+        await redis.set(
+            self.key(user_id, chat_id),
+            int(subscribed),
+            ex=self.positive_ttl if subscribed else self.negative_ttl,
+        )
+        return subscribed
+
+
+subscription_cache = SubscriptionCache(
+    positive_ttl=settings.SUBSCRIBE_CACHE_TTL,
+    negative_ttl=settings.SUBSCRIBE_NEGATIVE_CACHE_TTL,
+    concurrency=settings.SUBSCRIBE_CHECK_CONCURRENCY,
+)
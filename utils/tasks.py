@@ -1,17 +1,61 @@
+import asyncio
 import json
+import logging
+import os
+from types import MappingProxyType
+from typing import Mapping
 
 from core import settings
-from endpoint.models import Tasks
+from endpoint.models import Tasks, TypeTasks
 
-with open("utils/tasks.json", "r") as file:
-    tasks_json = json.load(file)
+TASKS_PATH = "utils/tasks.json"
 
-for tasks_list in tasks_json.values():
-    for task in tasks_list:
-        task["icon"] = f"https://{settings.S3_ENDPOINT}/static/{task['icon']}"
 
-tasks = tasks_json.get("Daily reward", []) + tasks_json.get("Tasks list", [])
-tasks: list[Tasks] = [Tasks.model_validate(task) for task in tasks]
+class TasksCatalog:
+    """tasks.json compiled once into frozen task models, shared read-only by every request."""
+
+    def __init__(self, groups: Mapping[TypeTasks, tuple[Tasks, ...]], mtime: float):
+        self.groups = groups
+        self.by_id: Mapping[int, Tasks] = MappingProxyType({
+            task.id: task for tasks_list in groups.values() for task in tasks_list
+        })
+        self.mtime = mtime
+
+    @classmethod
+    def load(cls, path: str = TASKS_PATH) -> "TasksCatalog":
+        with open(path, "r") as file:
+            mtime = os.fstat(file.fileno()).st_mtime
+            tasks_json = json.load(file)
+
+        groups = {
+            tasks_type: tuple(
+                Tasks.model_validate({**task, "icon": f"https://{settings.S3_ENDPOINT}/static/{task['icon']}"})
+                for task in tasks_list
+            ) for tasks_type, tasks_list in tasks_json.items()
+        }
+
+        return cls(MappingProxyType(groups), mtime)
+
+
+_catalog = TasksCatalog.load()
+
+
+def get_tasks_catalog() -> TasksCatalog:
+    return _catalog
+
+
+async def task_watch_tasks_catalog(path: str = TASKS_PATH, interval: float = 5):
+    global _catalog
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if os.stat(path).st_mtime != _catalog.mtime:
+                _catalog = TasksCatalog.load(path)
+                logging.info("tasks catalog reloaded with %s tasks", len(_catalog.by_id))
+        except Exception as e:
+            logging.exception("task watch tasks catalog exception", exc_info=e)
+
 
 rewards_for_daily: dict[int, int] = {
     1: 500,